@@ -18,6 +18,38 @@ class Settings(BaseSettings):
     homeassistant_url: Optional[str] = None
     homeassistant_token: Optional[str] = None
 
+    # Device hotplug
+    hotplug_mode: str = "auto"  # auto (udev if available), udev or poll
+    hotplug_poll_interval: float = 2.0  # Seconds between scans when polling
+
+    # Key events
+    key_event_queue_size: int = 64  # Presses waiting to be handled before new ones are dropped
+
+    # Scheduler
+    scheduler_workers: int = 2  # Threads for short timed jobs (identify flashes, settings writes)
+    data_refresh_workers: int = 8  # Threads for periodic data refreshes, which may block on slow sources
+
+    # Rendering
+    render_workers: int = 4  # Threads used to render a page's keys in parallel
+    render_backend: str = "thread"  # thread, or process to render in worker processes
+    render_processes: int = 2  # Worker processes of the process backend
+    icon_cache_bytes: int = 32 * 1024 * 1024  # Memory for decoded, scaled icons
+    base_layer_cache_bytes: int = 16 * 1024 * 1024  # Memory for composed background + icon layers
+    render_cache_bytes: int = 16 * 1024 * 1024  # Memory for finished key images
+    svg_cache_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "svg")  # SVG icons rasterized per key size
+    variant_cache_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "variants")  # Icons pre-scaled per key size
+    thumbnail_cache_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "thumbnails")  # Icon previews for the editor
+
+    # Animations
+    animation_fps: int = 15  # Frames per second of key animations
+    animation_frame_budget: int = 120  # Animation frames written per second per device, at most
+    animation_cache_bytes: int = 32 * 1024 * 1024  # Memory for precomputed animation frames
+
+    # Virtual decks (run without hardware, e.g. for benchmarks)
+    virtual_decks: int = 0  # Number of virtual decks to use instead of USB devices
+    virtual_deck_model: str = "mk2"  # mini, original, mk2, xl, neo or plus
+    virtual_deck_write_latency_ms: float = 0.0  # Simulated USB time per key image
+
     # Assets paths
     assets_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "Assets")
 
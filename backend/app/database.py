@@ -36,6 +36,12 @@ def run_migrations():
                 conn.execute(text("ALTER TABLE buttons ADD COLUMN animation_speed VARCHAR DEFAULT 'normal'"))
             if 'animation_trigger' not in columns:
                 conn.execute(text("ALTER TABLE buttons ADD COLUMN animation_trigger VARCHAR DEFAULT 'always'"))
+
+            # Add label font columns if they don't exist
+            if 'font_family' not in columns:
+                conn.execute(text('ALTER TABLE buttons ADD COLUMN font_family VARCHAR'))
+            if 'font_size' not in columns:
+                conn.execute(text('ALTER TABLE buttons ADD COLUMN font_size INTEGER'))
             conn.commit()
 
 
@@ -2,6 +2,7 @@ import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import logging
 
 from .config import settings
@@ -16,9 +17,12 @@ from .routers import (
     data_router,
     media_router,
     streaming_router,
+    render_router,
 )
 from .services.streamdeck import streamdeck_service
 from .services.websocket import websocket_manager
+from .services.registry import device_registry
+from .services.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +39,13 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Stream Deck Hub...")
     init_db()
 
+    # Load devices, profiles and buttons for the key press path
+    db = SessionLocal()
+    try:
+        device_registry.load(db)
+    finally:
+        db.close()
+
     # Set up Stream Deck service
     streamdeck_service.set_db_session_factory(SessionLocal)
     streamdeck_service.set_event_loop(asyncio.get_event_loop())
@@ -76,6 +87,7 @@ app.include_router(icons_router)
 app.include_router(data_router)
 app.include_router(media_router)
 app.include_router(streaming_router)
+app.include_router(render_router)
 
 
 @app.get("/")
@@ -94,6 +106,15 @@ def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time updates."""
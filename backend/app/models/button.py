@@ -16,6 +16,8 @@ class Button(Base):
     icon_path = Column(String, nullable=True)
     icon_color = Column(String, nullable=True)  # Hex color
     background_color = Column(String, nullable=True)  # Hex color
+    font_family = Column(String, nullable=True)  # Font file in Assets/fonts or an installed font, default Roboto
+    font_size = Column(Integer, nullable=True)  # Label size in pixels, default 14
     action_id = Column(String, ForeignKey("actions.id"), nullable=True)
 
     # Toggle button fields
@@ -7,6 +7,7 @@ from .icons import router as icons_router
 from .data import router as data_router
 from .media import router as media_router
 from .streaming import router as streaming_router
+from .render import router as render_router
 
 __all__ = [
     "devices_router",
@@ -18,4 +19,5 @@ __all__ = [
     "data_router",
     "media_router",
     "streaming_router",
+    "render_router",
 ]
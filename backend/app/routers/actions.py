@@ -7,6 +7,7 @@ from ..database import get_db
 from ..models.action import Action
 from ..schemas.action import ActionCreate, ActionUpdate, ActionResponse
 from ..services.action_executor import action_executor
+from ..services.registry import device_registry
 
 router = APIRouter(prefix="/api/actions", tags=["actions"])
 
@@ -89,6 +90,7 @@ def update_action(action_id: str, action_update: ActionUpdate, db: Session = Dep
 
     db.commit()
     db.refresh(action)
+    device_registry.reload_action(db, action_id)
 
     config = json.loads(action.config) if isinstance(action.config, str) else action.config
     return ActionResponse(
@@ -110,6 +112,7 @@ def delete_action(action_id: str, db: Session = Depends(get_db)):
 
     db.delete(action)
     db.commit()
+    device_registry.reload_action(db, action_id)
     return {"status": "deleted"}
 
 
@@ -8,6 +8,7 @@ from ..models.button import Button
 from ..models.device import Device
 from ..schemas.button import ButtonCreate, ButtonUpdate, ButtonResponse
 from ..services.streamdeck import streamdeck_service
+from ..services.registry import device_registry
 
 router = APIRouter(prefix="/api/profiles/{profile_id}/buttons", tags=["buttons"])
 
@@ -66,9 +67,10 @@ def update_button(
 
     db.commit()
     db.refresh(button)
+    device_registry.reload_profile(db, profile_id)
 
     # Update physical devices using this profile (only if on current page)
-    _update_connected_devices(profile_id, position, button, db, button_page)
+    _update_connected_devices(profile_id, position, db, button_page)
 
     return button
 
@@ -89,6 +91,8 @@ def delete_button(profile_id: str, position: int, page: int = 0, db: Session = D
     if button:
         db.delete(button)
         db.commit()
+        device_registry.reload_profile(db, profile_id)
+        streamdeck_service.invalidate_prerender(profile_id)
 
         # Update physical devices (only if on same page)
         devices = db.query(Device).filter(Device.active_profile_id == profile_id).all()
@@ -96,13 +100,18 @@ def delete_button(profile_id: str, position: int, page: int = 0, db: Session = D
             if streamdeck_service.is_device_connected(device.serial_number):
                 state = streamdeck_service.get_device_state(device.serial_number)
                 if state and state.get("current_page", 0) == page:
-                    streamdeck_service.refresh_device(device.serial_number, db, page)
+                    streamdeck_service.refresh_device(device.serial_number, page)
 
     return {"status": "deleted"}
 
 
-def _update_connected_devices(profile_id: str, position: int, button: Button, db: Session, page: int = 0):
+def _update_connected_devices(profile_id: str, position: int, db: Session, page: int = 0):
     """Update the button on all connected devices using this profile (if on same page)."""
+    streamdeck_service.invalidate_prerender(profile_id)
+    button = device_registry.get_button(profile_id, page, position)
+    if not button:
+        return
+
     devices = db.query(Device).filter(Device.active_profile_id == profile_id).all()
 
     for device in devices:
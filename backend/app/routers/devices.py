@@ -6,6 +6,7 @@ from ..database import get_db
 from ..models.device import Device
 from ..schemas.device import DeviceResponse, DeviceUpdate
 from ..services.streamdeck import streamdeck_service
+from ..services.registry import device_registry
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
@@ -74,6 +75,9 @@ def update_device(device_id: str, device_update: DeviceUpdate, db: Session = Dep
     db.commit()
     db.refresh(device)
 
+    if "active_profile_id" in update_data:
+        device_registry.set_active_profile(device.serial_number, device.active_profile_id)
+
     # Apply changes to physical device
     connected_serials = streamdeck_service.get_connected_devices()
     is_connected = device.serial_number in connected_serials
@@ -82,7 +86,7 @@ def update_device(device_id: str, device_update: DeviceUpdate, db: Session = Dep
         if "brightness" in update_data:
             streamdeck_service.set_brightness(device.serial_number, device.brightness)
         if "active_profile_id" in update_data:
-            streamdeck_service.refresh_device(device.serial_number, db)
+            streamdeck_service.refresh_device(device.serial_number)
 
     return DeviceResponse(
         id=device.id,
@@ -111,3 +115,16 @@ def identify_device(device_id: str, db: Session = Depends(get_db)):
 
     streamdeck_service.identify_device(device.serial_number)
     return {"status": "identifying"}
+
+
+@router.get("/{device_id}/state")
+def get_device_state(device_id: str, db: Session = Depends(get_db)):
+    """Get the runtime state of a connected device (page, folder depth, page switch timing)."""
+    device = db.query(Device).filter(Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    state = streamdeck_service.get_device_state(device.serial_number)
+    if state is None:
+        raise HTTPException(status_code=400, detail="Device is not connected")
+    return state
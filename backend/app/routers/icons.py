@@ -1,55 +1,72 @@
 import os
 import uuid
 import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
-from typing import List
+import hashlib
+from email.utils import formatdate
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from typing import List, Optional
 
 from ..config import settings
+from ..services.icon_index import IconIndex
+from ..services.streamdeck import streamdeck_service
+from ..utils.icon_variants import KEY_SIZES, generate_variants, remove_variants
+from ..utils.thumbnails import THUMBNAIL_FORMATS, file_version, get_thumbnail
 
 router = APIRouter(prefix="/api/icons", tags=["icons"])
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads", "icons")
-ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg"}
+# SVGs can carry scripts; served icons must never run them
+SVG_HEADERS = {"Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox"}
+# Thumbnail URLs carrying the icon's version (?v=) never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+icon_index = IconIndex(ALLOWED_EXTENSIONS)
+icon_index.add_source("asset", settings.images_path, "/api/icons/asset/")
+icon_index.add_source("upload", UPLOAD_DIR, "/api/icons/upload/")
 
 
 def get_all_icons() -> List[dict]:
     """Get all available icons from assets and uploads."""
-    icons = []
-
-    # Get icons from Assets/images
-    if os.path.exists(settings.images_path):
-        for filename in os.listdir(settings.images_path):
-            ext = os.path.splitext(filename)[1].lower()
-            if ext in ALLOWED_EXTENSIONS:
-                icons.append({
-                    "name": filename,
-                    "path": f"/api/icons/asset/{filename}",
-                    "source": "asset"
-                })
-
-    # Get uploaded icons
-    if os.path.exists(UPLOAD_DIR):
-        for filename in os.listdir(UPLOAD_DIR):
-            ext = os.path.splitext(filename)[1].lower()
-            if ext in ALLOWED_EXTENSIONS:
-                icons.append({
-                    "name": filename,
-                    "path": f"/api/icons/upload/{filename}",
-                    "source": "upload"
-                })
-
-    return sorted(icons, key=lambda x: x["name"].lower())
+    return icon_index.all()
+
+
+def _icon_response(file_path: str) -> FileResponse:
+    if file_path.lower().endswith(".svg"):
+        return FileResponse(file_path, media_type="image/svg+xml", headers=SVG_HEADERS)
+    return FileResponse(file_path)
 
 
 @router.get("")
-def list_icons():
-    """List all available icons."""
-    return {"icons": get_all_icons()}
+def list_icons(
+    request: Request,
+    q: Optional[str] = None,
+    source: Optional[str] = None,
+    fuzzy: bool = True,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000)
+):
+    """List available icons, optionally searched, filtered by source and paginated.
+
+    The ETag changes whenever the library or the query does, so clients
+    can revalidate with If-None-Match and skip unchanged listings.
+    """
+    query = f"{icon_index.etag()}|{q or ''}|{source or ''}|{fuzzy}|{offset}|{limit}"
+    etag = f'"{hashlib.blake2b(query.encode(), digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    icons = icon_index.search(q, source, fuzzy) if q or source else icon_index.all()
+    page = icons[offset:offset + limit] if limit else icons[offset:]
+    response = {"icons": page, "total": len(icons), "offset": offset, "limit": limit}
+    return JSONResponse(response, headers=headers)
 
 
 @router.post("/upload")
-async def upload_icon(file: UploadFile = File(...)):
+async def upload_icon(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """Upload a new icon."""
     # Validate file extension
     ext = os.path.splitext(file.filename)[1].lower()
@@ -69,12 +86,13 @@ async def upload_icon(file: UploadFile = File(...)):
     # Save file
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    icon = icon_index.add("upload", unique_name)
 
-    return {
-        "name": unique_name,
-        "path": f"/api/icons/upload/{unique_name}",
-        "source": "upload"
-    }
+    # Scale it for the connected decks now, not on the first key that shows it
+    if ext != ".svg":
+        background_tasks.add_task(generate_variants, file_path, streamdeck_service.get_key_sizes() or KEY_SIZES)
+
+    return icon
 
 
 @router.get("/asset/{filename}")
@@ -83,7 +101,44 @@ def get_asset_icon(filename: str):
     file_path = os.path.join(settings.images_path, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Icon not found")
-    return FileResponse(file_path)
+    return _icon_response(file_path)
+
+
+@router.get("/{source}/{filename}/thumbnail")
+def get_icon_thumbnail(
+    source: str,
+    filename: str,
+    request: Request,
+    size: int = Query(64, ge=16, le=512),
+    format: str = Query("webp", pattern=f"^({'|'.join(THUMBNAIL_FORMATS)})$"),
+    v: Optional[str] = None
+):
+    """Serve an icon scaled to fit size x size, e.g. for the editor's icon grid."""
+    directories = {"asset": settings.images_path, "upload": UPLOAD_DIR}
+    if source not in directories:
+        raise HTTPException(status_code=404, detail="Icon not found")
+    file_path = os.path.join(directories[source], filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Icon not found")
+    if file_path.lower().endswith(".svg"):
+        # Vector icons are small already and scale in the browser
+        return _icon_response(file_path)
+
+    try:
+        version = file_version(file_path)
+        thumbnail, digest = get_thumbnail(file_path, size, format)
+    except OSError:
+        raise HTTPException(status_code=415, detail="Icon cannot be read as an image")
+
+    headers = {
+        "ETag": f'"{digest}-{size}-{format}"',
+        "Last-Modified": formatdate(os.stat(file_path).st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE if v == version else "no-cache",
+        "X-Icon-Version": version,
+    }
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumbnail, media_type=THUMBNAIL_FORMATS[format][1], headers=headers)
 
 
 @router.get("/upload/{filename}")
@@ -92,7 +147,7 @@ def get_uploaded_icon(filename: str):
     file_path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Icon not found")
-    return FileResponse(file_path)
+    return _icon_response(file_path)
 
 
 @router.delete("/upload/{filename}")
@@ -103,4 +158,8 @@ def delete_uploaded_icon(filename: str):
         raise HTTPException(status_code=404, detail="Icon not found")
 
     os.remove(file_path)
+    icon_index.remove("upload", filename)
+    remove_variants(file_path)
+    # Buttons using this icon render differently now
+    streamdeck_service.invalidate_prerender()
     return {"status": "deleted"}
@@ -10,6 +10,8 @@ from ..models.profile import Profile
 from ..models.button import Button
 from ..models.action import Action
 from ..schemas.profile import ProfileCreate, ProfileUpdate, ProfileResponse, ProfileExport
+from ..services.streamdeck import streamdeck_service
+from ..services.registry import device_registry
 
 router = APIRouter(prefix="/api/profiles", tags=["profiles"])
 
@@ -70,6 +72,8 @@ def delete_profile(profile_id: str, db: Session = Depends(get_db)):
 
     db.delete(profile)
     db.commit()
+    device_registry.remove_profile(profile_id)
+    streamdeck_service.invalidate_prerender(profile_id)
     return {"status": "deleted"}
 
 
@@ -101,6 +105,8 @@ def duplicate_profile(profile_id: str, db: Session = Depends(get_db)):
             icon_path=button.icon_path,
             icon_color=button.icon_color,
             background_color=button.background_color,
+            font_family=button.font_family,
+            font_size=button.font_size,
             action_id=button.action_id,
             is_toggle=button.is_toggle,
             on_color=button.on_color,
@@ -117,6 +123,7 @@ def duplicate_profile(profile_id: str, db: Session = Depends(get_db)):
 
     db.commit()
     db.refresh(new_profile)
+    device_registry.reload_profile(db, new_profile.id)
     return new_profile
 
 
@@ -145,6 +152,8 @@ def export_profile(profile_id: str, db: Session = Depends(get_db)):
                 "icon_path": b.icon_path,
                 "icon_color": b.icon_color,
                 "background_color": b.background_color,
+                "font_family": b.font_family,
+                "font_size": b.font_size,
                 "action_id": b.action_id,
                 "is_toggle": b.is_toggle,
                 "on_color": b.on_color,
@@ -215,6 +224,8 @@ def import_profile(profile_data: ProfileExport, db: Session = Depends(get_db)):
             icon_path=button_data.get("icon_path"),
             icon_color=button_data.get("icon_color"),
             background_color=button_data.get("background_color"),
+            font_family=button_data.get("font_family"),
+            font_size=button_data.get("font_size"),
             action_id=new_action_id,
             is_toggle=button_data.get("is_toggle", False),
             on_color=button_data.get("on_color"),
@@ -231,4 +242,5 @@ def import_profile(profile_data: ProfileExport, db: Session = Depends(get_db)):
 
     db.commit()
     db.refresh(new_profile)
+    device_registry.reload_profile(db, new_profile.id)
     return new_profile
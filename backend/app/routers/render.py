@@ -0,0 +1,26 @@
+"""Render API router for key image cache and render backend statistics."""
+from fastapi import APIRouter
+
+from ..services.animation import animation_engine
+from ..services.streamdeck import streamdeck_service
+from ..utils.image import image_renderer
+
+router = APIRouter(prefix="/api/render", tags=["render"])
+
+
+@router.get("/stats")
+def get_render_stats():
+    """Get hit rates and memory use of the key image, icon and font caches,
+    and the work done by the render backend and the animation engine."""
+    stats = image_renderer.cache_stats()
+    stats["backend"] = streamdeck_service.renderer.stats()
+    stats["animations"] = animation_engine.stats()
+    return stats
+
+
+@router.delete("/cache")
+def clear_render_cache():
+    """Drop all cached key images, icons, fonts and animation frames."""
+    image_renderer.clear_caches()
+    animation_engine.frame_cache.clear()
+    return {"status": "cleared"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Any, Dict
 from datetime import datetime
 
@@ -11,6 +11,10 @@ class ButtonBase(BaseModel):
     action_id: Optional[str] = None
     page: int = 0  # Page number, default to first page
 
+    # Label font fields
+    font_family: Optional[str] = None  # Font file in Assets/fonts or an installed font
+    font_size: Optional[int] = Field(None, ge=6, le=72)
+
     # Toggle button fields
     is_toggle: bool = False
     on_color: Optional[str] = None
@@ -47,6 +51,10 @@ class ButtonResponse(BaseModel):
     background_color: Optional[str]
     action_id: Optional[str]
 
+    # Label font fields
+    font_family: Optional[str] = None
+    font_size: Optional[int] = None
+
     # Toggle button fields
     is_toggle: bool = False
     on_color: Optional[str] = None
@@ -0,0 +1,435 @@
+"""Key animations: precomputed frame sequences played from the scheduler's animation lane."""
+import hashlib
+import math
+import threading
+import time
+from bisect import bisect_right
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from PIL import Image, ImageEnhance, ImageFilter
+import logging
+
+from ..config import settings
+from ..utils.cache import LRUCache
+from ..utils.image import image_renderer
+from ..utils.native import to_native_key_format
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Seconds per cycle, as in the web UI's preview
+SPEEDS = {"slow": 3.0, "normal": 1.5, "fast": 0.75}
+
+DEFAULT_GLOW_COLOR = "#7c3aed"
+
+
+def _wave(phase: float) -> float:
+    """Ease in and out from 0 at the start of a cycle to 1 halfway and back."""
+    return (1 - math.cos(2 * math.pi * phase)) / 2
+
+
+def _scaled(image: Image.Image, scale: float) -> Image.Image:
+    """Zoom into the center of an image, keeping its size."""
+    width, height = image.size
+    scaled = image.resize((round(width * scale), round(height * scale)), Image.Resampling.BILINEAR)
+    left = (scaled.width - width) // 2
+    top = (scaled.height - height) // 2
+    return scaled.crop((left, top, left + width, top + height))
+
+
+def _shifted(image: Image.Image, dx: int, dy: int, fill: str) -> Image.Image:
+    if not dx and not dy:
+        return image
+    frame = Image.new("RGB", image.size, fill)
+    frame.paste(image, (dx, dy))
+    return frame
+
+
+def _faded(image: Image.Image, opacity: float) -> Image.Image:
+    return Image.blend(Image.new("RGB", image.size, "black"), image, opacity)
+
+
+def _pulse(image, phase, options):
+    w = _wave(phase)
+    return _faded(_scaled(image, 1 + 0.05 * w), 1 - 0.15 * w)
+
+
+def _flash(image, phase, options):
+    return _faded(image, 1 - 0.7 * _wave(phase))
+
+
+def _breathe(image, phase, options):
+    w = _wave(phase)
+    return ImageEnhance.Brightness(_scaled(image, 1 + 0.02 * w)).enhance(1 + 0.15 * w)
+
+
+def _glow(image, phase, options):
+    mask = options["glow_mask"].point(lambda v, w=_wave(phase): round(v * w))
+    return Image.composite(Image.new("RGB", image.size, options["glow_color"]), image, mask)
+
+
+def _color_cycle(image, phase, options):
+    shift = round(phase * 256)
+    hue, saturation, value = image.convert("HSV").split()
+    hue = hue.point(lambda h: (h + shift) % 256)
+    return Image.merge("HSV", (hue, saturation, value)).convert("RGB")
+
+
+def _bounce(image, phase, options):
+    # 4 px on a 72 px key
+    dy = -round(image.height * 4 / 72 * _wave(phase))
+    return _shifted(image, 0, dy, options["background"])
+
+
+def _shake(image, phase, options):
+    # 2 px either way on a 72 px key
+    dx = -round(image.width * 2 / 72 * math.sin(2 * math.pi * phase))
+    return _shifted(image, dx, 0, options["background"])
+
+
+# Effects map the still image and a phase in [0, 1) to a frame; phase 0 is the still image
+EFFECTS: Dict[str, Callable] = {
+    "pulse": _pulse,
+    "flash": _flash,
+    "glow": _glow,
+    "color_cycle": _color_cycle,
+    "bounce": _bounce,
+    "shake": _shake,
+    "breathe": _breathe,
+}
+
+
+def _glow_mask(size: Tuple[int, int]) -> Image.Image:
+    """Soft ring along the key's edges."""
+    width, height = size
+    border = max(2, width // 12)
+    mask = Image.new("L", size, 255)
+    mask.paste(0, (border, border, width - border, height - border))
+    return mask.filter(ImageFilter.GaussianBlur(border / 2))
+
+
+class FrameSet(NamedTuple):
+    """Native frames of one cycle of an animation, shared by all keys showing it."""
+    frames: tuple
+    ends: tuple  # seconds into the cycle at which each frame ends
+
+    @property
+    def duration(self) -> float:
+        return self.ends[-1]
+
+    def index_at(self, elapsed: float) -> int:
+        """Frame shown at a time into the cycle."""
+        return min(bisect_right(self.ends, elapsed % self.duration), len(self.frames) - 1)
+
+
+def _frames_nbytes(frame_set: FrameSet) -> int:
+    return sum(len(frame) for frame in frame_set.frames)
+
+
+class KeyAnimation:
+    """Frames of one animated key and where it is in them."""
+    def __init__(self, frame_set: FrameSet, trigger: str):
+        self.frame_set = frame_set
+        self.frames = frame_set.frames
+        self.trigger = trigger
+        self.active = False
+        self.started = 0.0
+        self.last_index = -1
+
+    def start(self, now: float):
+        self.active = True
+        self.started = now
+        self.last_index = -1
+
+
+class DeviceAnimations:
+    """Animated keys of one device."""
+    def __init__(self, writer):
+        self.writer = writer
+        self.keys: Dict[int, KeyAnimation] = {}
+        self.cursor = 0  # Where the next tick starts, so no key is starved by the budget
+
+
+class AnimationEngine:
+    """Plays key animations for all devices from one scheduler job.
+
+    Keys play either an animation effect, or the frames of an animated
+    GIF, PNG or WebP icon with their own delays. The frames are rendered
+    and encoded once and cached by the key's render inputs, so keys showing
+    the same animation share one frame set, and playing it is only a
+    matter of handing cached images to the device's key writer. A single
+    repeating job ticks at the animation frame rate while any animation is
+    registered and only touches animated keys; icon frames shorter than a
+    tick are skipped, so playback keeps the icon's timing.
+
+    Each device has a budget of animation frames per second. When more keys
+    are due than the budget allows, the rest wait for the next tick, in
+    turn, and no frames are queued while the device's writer is still busy
+    with earlier ones, so animations never crowd out key presses and page
+    changes on the USB link.
+    """
+
+    def __init__(self):
+        self.fps = settings.animation_fps
+        self.frame_cache = LRUCache(settings.animation_cache_bytes, sizeof=_frames_nbytes)
+        self._devices: Dict[str, DeviceAnimations] = {}  # serial -> DeviceAnimations
+        self._lock = threading.Lock()
+        self._building: Dict[bytes, threading.Lock] = {}  # frame set key -> lock held while rendering it
+        self._job: Optional[int] = None
+
+        # Counters
+        self.frames_written = 0
+        self.frames_deferred = 0
+
+    # Frames
+
+    def frames(self, deck, button, label: Optional[str] = None) -> Optional[FrameSet]:
+        """Native frames of a button's animation, rendered on first use.
+
+        An animation effect takes precedence over an animated icon, and is
+        applied to the icon's first frame.
+        """
+        effect = EFFECTS.get(button.animation or "none")
+        inputs = dict(
+            icon_path=button.icon_path,
+            label=label,
+            background_color=button.background_color,
+            icon_color=button.icon_color,
+            font_size=button.font_size or 14,
+            font_family=button.font_family
+        )
+        if effect is not None:
+            return self._effect_frames(deck, effect, button, inputs)
+        if button.icon_path and image_renderer.is_animated_icon(button.icon_path):
+            return self._icon_frames(deck, inputs)
+        return None
+
+    def _frame_set_key(self, deck, inputs: dict, *animation) -> bytes:
+        return hashlib.blake2b(
+            image_renderer.key_image_cache_key(deck, **inputs) + repr(animation).encode(),
+            digest_size=16
+        ).digest()
+
+    def _cached(self, cache_key: bytes, build: Callable[[], Optional[FrameSet]]) -> Optional[FrameSet]:
+        """Get a frame set from the cache, rendering it once even if several keys ask at the same time."""
+        frame_set = self.frame_cache.get(cache_key)
+        if frame_set is not None:
+            return frame_set
+
+        with self._lock:
+            lock = self._building.setdefault(cache_key, threading.Lock())
+        try:
+            with lock:
+                frame_set = self.frame_cache.get(cache_key)
+                if frame_set is None:
+                    frame_set = build()
+                    if frame_set is not None:
+                        self.frame_cache.put(cache_key, frame_set)
+        finally:
+            with self._lock:
+                self._building.pop(cache_key, None)
+        return frame_set
+
+    def _effect_frames(self, deck, effect: Callable, button, inputs: dict) -> FrameSet:
+        duration = SPEEDS.get(button.animation_speed or "normal", SPEEDS["normal"])
+        glow_color = button.on_color or button.icon_color or DEFAULT_GLOW_COLOR
+        cache_key = self._frame_set_key(deck, inputs, button.animation, duration, self.fps, glow_color)
+
+        def build():
+            still = image_renderer.compose_key_image(deck, **inputs)
+            options = {
+                "background": button.background_color or "black",
+                "glow_color": glow_color,
+                "glow_mask": _glow_mask(still.size) if effect is _glow else None,
+            }
+            count = max(2, round(duration * self.fps))
+            return FrameSet(
+                frames=tuple(
+                    to_native_key_format(deck, effect(still, index / count, options) if index else still)
+                    for index in range(count)
+                ),
+                ends=tuple((index + 1) / self.fps for index in range(count))
+            )
+
+        return self._cached(cache_key, build)
+
+    def _icon_frames(self, deck, inputs: dict) -> Optional[FrameSet]:
+        def build():
+            images = image_renderer.compose_animated_key_images(deck, **inputs)
+            if not images:
+                return None
+            frames, ends, elapsed = [], [], 0.0
+            for image, delay in images:
+                elapsed += delay
+                frames.append(to_native_key_format(deck, image))
+                ends.append(elapsed)
+            return FrameSet(tuple(frames), tuple(ends))
+
+        return self._cached(self._frame_set_key(deck, inputs, "icon"), build)
+
+    # Keys
+
+    @staticmethod
+    def animates(button) -> bool:
+        """Whether a button has an animation effect or an animated icon."""
+        if (button.animation or "none") in EFFECTS:
+            return True
+        return bool(button.icon_path) and image_renderer.is_animated_icon(button.icon_path)
+
+    def set_key(self, serial: str, deck, writer, button, label: Optional[str] = None, state: Optional[bool] = None):
+        """Register or update the animation of a key shown on a device.
+
+        state is the key's toggle state, None if unknown. A key whose frames
+        change, e.g. a data key with a new value, keeps its place in the cycle.
+        """
+        frame_set = self.frames(deck, button, label)
+        if frame_set is None:
+            self.clear_key(serial, button.position)
+            return
+
+        # Animated icons without an effect always play
+        trigger = (button.animation_trigger or "always") if button.animation in EFFECTS else "always"
+        now = time.monotonic()
+        with self._lock:
+            device = self._devices.get(serial)
+            if device is None or device.writer is not writer:
+                device = self._devices[serial] = DeviceAnimations(writer)
+
+            old = device.keys.get(button.position)
+            animation = KeyAnimation(frame_set, trigger)
+            if old and old.trigger == trigger and old.active:
+                animation.active, animation.started = True, old.started
+            elif self._triggered(trigger, state):
+                animation.start(now)
+            device.keys[button.position] = animation
+
+        if not animation.active:
+            writer.submit(button.position, frame_set.frames[0], urgent=False)
+        self._update_ticker()
+
+    def clear_key(self, serial: str, key: int):
+        with self._lock:
+            device = self._devices.get(serial)
+            if device:
+                device.keys.pop(key, None)
+        self._update_ticker()
+
+    def clear_device(self, serial: str):
+        """Stop all animations of a device, e.g. before showing another page."""
+        with self._lock:
+            self._devices.pop(serial, None)
+        self._update_ticker()
+
+    def is_animated(self, serial: str, key: int) -> bool:
+        with self._lock:
+            device = self._devices.get(serial)
+            return bool(device and key in device.keys)
+
+    def press(self, serial: str, key: int):
+        """Play an on_press animation once from the start."""
+        with self._lock:
+            device = self._devices.get(serial)
+            animation = device.keys.get(key) if device else None
+            if animation and animation.trigger == "on_press":
+                animation.start(time.monotonic())
+
+    def set_state(self, serial: str, key: int, state: Optional[bool]):
+        """Start or stop an on_state_on / on_state_off animation."""
+        with self._lock:
+            device = self._devices.get(serial)
+            animation = device.keys.get(key) if device else None
+            if not animation or animation.trigger not in ("on_state_on", "on_state_off"):
+                return
+            triggered = self._triggered(animation.trigger, state)
+            if triggered and not animation.active:
+                animation.start(time.monotonic())
+            elif not triggered and animation.active:
+                animation.active = False
+                device.writer.submit(key, animation.frames[0], urgent=False)
+
+    @staticmethod
+    def _triggered(trigger: str, state: Optional[bool]) -> bool:
+        if trigger == "on_state_on":
+            return state is True
+        if trigger == "on_state_off":
+            return state is False
+        # Presses start on_press animations; unknown triggers animate like the web UI
+        return trigger != "on_press"
+
+    # Playback
+
+    def _update_ticker(self):
+        """Run the tick job only while any key is animated."""
+        with self._lock:
+            needed = any(device.keys for device in self._devices.values())
+            if needed and self._job is None:
+                self._job = scheduler.schedule(
+                    0, self._tick, interval=1.0 / self.fps, lane="animation", kind="animation"
+                )
+            elif not needed and self._job is not None:
+                scheduler.cancel(self._job)
+                self._job = None
+
+    def _tick(self):
+        now = time.monotonic()
+        budget = max(1, settings.animation_frame_budget // self.fps)
+        with self._lock:
+            devices = list(self._devices.values())
+
+        for device in devices:
+            if device.writer.pending_count() >= budget:
+                # The device has not caught up with the last tick
+                continue
+
+            with self._lock:
+                keys = list(device.keys.items())
+            if not keys:
+                continue
+
+            start = device.cursor % len(keys)
+            written = 0
+            for offset in range(len(keys)):
+                position = (start + offset) % len(keys)
+                key, animation = keys[position]
+                if not animation.active:
+                    continue
+
+                elapsed = now - animation.started
+                # on_press animations play once, then go back to the still image
+                finished = animation.trigger == "on_press" and elapsed >= animation.frame_set.duration
+                index = 0 if finished else animation.frame_set.index_at(elapsed)
+                if index == animation.last_index:
+                    animation.active = not finished
+                    continue
+
+                if written >= budget:
+                    if written == budget:
+                        # The first key left out goes first next tick
+                        device.cursor = position
+                    self.frames_deferred += 1
+                    written += 1
+                    continue
+                device.writer.submit(key, animation.frames[index], urgent=False)
+                animation.last_index = index
+                animation.active = not finished
+                written += 1
+            self.frames_written += min(written, budget)
+
+    def stop(self):
+        """Forget all animations; the scheduler drops the tick job when it stops."""
+        with self._lock:
+            self._devices.clear()
+            self._job = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            animated = {serial: len(device.keys) for serial, device in self._devices.items()}
+        return {
+            "fps": self.fps,
+            "animated_keys": animated,
+            "frames_written": self.frames_written,
+            "frames_deferred": self.frames_deferred,
+            "frames": self.frame_cache.stats(),
+        }
+
+
+animation_engine = AnimationEngine()
@@ -0,0 +1,124 @@
+"""Hotplug event sources that tell the Stream Deck service when to rescan."""
+import sys
+import threading
+from typing import Callable, Optional
+import logging
+
+from ..config import settings
+
+# Try to import pyudev for netlink based hotplug events (Linux only)
+try:
+    import pyudev
+    PYUDEV_AVAILABLE = True
+except ImportError:
+    PYUDEV_AVAILABLE = False
+    pyudev = None
+
+logger = logging.getLogger(__name__)
+
+ELGATO_VENDOR_ID = "0fd9"
+
+
+class HotplugEventSource:
+    """Base class for hotplug event sources.
+
+    A source calls the callback given to start() whenever the set of attached
+    decks may have changed. The callback must be cheap and thread-safe; the
+    service only rescans in response, and never probes already open decks.
+    """
+    name = "base"
+
+    def start(self, on_change: Callable[[], None]):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class ManualEventSource(HotplugEventSource):
+    """Event source driven by explicit trigger() calls (tests, virtual decks)."""
+    name = "manual"
+
+    def __init__(self):
+        self._on_change: Optional[Callable[[], None]] = None
+
+    def start(self, on_change: Callable[[], None]):
+        self._on_change = on_change
+
+    def stop(self):
+        self._on_change = None
+
+    def trigger(self):
+        """Report that a device was added or removed."""
+        if self._on_change:
+            self._on_change()
+
+
+class PollingEventSource(HotplugEventSource):
+    """Fallback source that requests a rescan at a fixed interval."""
+    name = "poll"
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, on_change: Callable[[], None]):
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                on_change()
+
+        self._thread = threading.Thread(target=run, name="hotplug-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(1.0)
+        self._thread = None
+
+
+class UdevEventSource(HotplugEventSource):
+    """Netlink source that reports Elgato USB and hidraw add/remove events."""
+    name = "udev"
+
+    def __init__(self):
+        self._observer = None
+
+    def start(self, on_change: Callable[[], None]):
+        context = pyudev.Context()
+        monitor = pyudev.Monitor.from_netlink(context)
+        monitor.filter_by("usb")
+        monitor.filter_by("hidraw")
+
+        def handle(device):
+            if device.action not in ("add", "remove"):
+                return
+            if device.subsystem == "usb":
+                # Removed devices lose most attributes, PRODUCT is "vid/pid/rev"
+                vendor = device.get("ID_VENDOR_ID") or device.get("PRODUCT", "").split("/")[0].zfill(4)
+                if vendor.lower() != ELGATO_VENDOR_ID:
+                    return
+            on_change()
+
+        self._observer = pyudev.MonitorObserver(monitor, callback=handle, name="hotplug-udev")
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop(self):
+        if self._observer:
+            self._observer.send_stop()
+            self._observer = None
+
+
+def create_event_source() -> HotplugEventSource:
+    """Create the configured hotplug source, falling back to polling."""
+    mode = settings.hotplug_mode
+    if mode in ("auto", "udev"):
+        if PYUDEV_AVAILABLE and sys.platform.startswith("linux"):
+            return UdevEventSource()
+        if mode == "udev":
+            logger.warning("pyudev not available, falling back to polling. Install with: pip install pyudev")
+    return PollingEventSource(settings.hotplug_poll_interval)
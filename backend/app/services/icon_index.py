@@ -0,0 +1,192 @@
+"""In-memory index of the icon library, for listing and searching icons."""
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from ..utils.thumbnails import file_version
+
+logger = logging.getLogger(__name__)
+
+
+def _sort_key(icon: dict) -> Tuple[str, str]:
+    return icon["name"].lower(), icon["path"]
+
+
+def _fuzzy_span(query: str, name: str) -> Optional[int]:
+    """Length of the part of name from the first to the last character of query,
+    taking each character's first occurrence in order, or None if name lacks one."""
+    position = start = -1
+    for char in query:
+        position = name.find(char, position + 1)
+        if position < 0:
+            return None
+        if start < 0:
+            start = position
+    return position - start + 1
+
+
+class IconIndex:
+    """Sorted list of the icons in the asset and upload directories.
+
+    Built once on first use and kept current by the upload and delete
+    endpoints. Files added or removed by other means are picked up by
+    checking the directories' modification times, at most every
+    CHECK_INTERVAL seconds, and rescanning only a directory that changed.
+
+    Each icon carries a version token from its file's modification time and
+    size, for thumbnail URLs that can be cached forever.
+    """
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self, extensions: set):
+        self.extensions = extensions
+        self._sources: Dict[str, Tuple[str, str]] = {}  # source -> (directory, URL prefix)
+        self._icons: List[dict] = []
+        self._keys: List[Tuple[str, str]] = []  # _sort_key of each icon, for bisection
+        self._dir_mtimes: Dict[str, Optional[int]] = {}  # source -> directory mtime at last scan
+        self._checked = 0.0
+        self._etag: Optional[str] = None
+        self._lock = threading.RLock()
+
+    def add_source(self, source: str, directory: str, url_prefix: str):
+        with self._lock:
+            self._sources[source] = (directory, url_prefix)
+            self._dir_mtimes.pop(source, None)
+            self._checked = 0.0
+
+    # Maintenance
+
+    def _dir_mtime(self, directory: str) -> Optional[int]:
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Rescan directories that changed since the last scan."""
+        now = time.monotonic()
+        if now - self._checked < self.CHECK_INTERVAL:
+            return
+        self._checked = now
+
+        for source, (directory, url_prefix) in self._sources.items():
+            mtime = self._dir_mtime(directory)
+            if source in self._dir_mtimes and self._dir_mtimes[source] == mtime:
+                continue
+            self._dir_mtimes[source] = mtime
+            self._scan(source, directory, url_prefix)
+
+    def _scan(self, source: str, directory: str, url_prefix: str):
+        icons = [icon for icon in self._icons if icon["source"] != source]
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            filenames = []
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in self.extensions:
+                icons.append(self._entry(source, directory, url_prefix, filename))
+
+        icons.sort(key=_sort_key)
+        self._icons = icons
+        self._keys = [_sort_key(icon) for icon in icons]
+        self._etag = None
+        logger.debug(f"Indexed {len(filenames)} files in {directory}")
+
+    def _entry(self, source: str, directory: str, url_prefix: str, filename: str) -> dict:
+        try:
+            version = file_version(os.path.join(directory, filename))
+        except OSError:
+            version = None
+        return {"name": filename, "path": f"{url_prefix}{filename}", "source": source, "version": version}
+
+    def add(self, source: str, filename: str) -> dict:
+        """Add a file, e.g. right after it was uploaded, and return its entry."""
+        with self._lock:
+            self._refresh()
+            directory, url_prefix = self._sources[source]
+            icon = self._entry(source, directory, url_prefix, filename)
+            key = _sort_key(icon)
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                return self._icons[index]
+            # New lists, never changed in place, as searches read them without the lock
+            self._keys = self._keys[:index] + [key] + self._keys[index:]
+            self._icons = self._icons[:index] + [icon] + self._icons[index:]
+            self._dir_mtimes[source] = self._dir_mtime(directory)
+            self._etag = None
+            return icon
+
+    def remove(self, source: str, filename: str):
+        """Remove a file, e.g. right after it was deleted."""
+        with self._lock:
+            self._refresh()
+            directory, url_prefix = self._sources[source]
+            key = (filename.lower(), f"{url_prefix}{filename}")
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                self._keys = self._keys[:index] + self._keys[index + 1:]
+                self._icons = self._icons[:index] + self._icons[index + 1:]
+            self._dir_mtimes[source] = self._dir_mtime(directory)
+            self._etag = None
+
+    # Queries
+
+    def all(self) -> List[dict]:
+        with self._lock:
+            self._refresh()
+            return list(self._icons)
+
+    def etag(self) -> str:
+        """Hash of the listing; equal listings have equal ETags, also across restarts."""
+        with self._lock:
+            self._refresh()
+            if self._etag is None:
+                digest = hashlib.blake2b(digest_size=16)
+                for icon in self._icons:
+                    digest.update(f"{icon['source']}\0{icon['name']}\0{icon['version']}\n".encode())
+                self._etag = digest.hexdigest()
+            return self._etag
+
+    def search(self, query: str = None, source: str = None, fuzzy: bool = True) -> List[dict]:
+        """Icons matching a query, best matches first.
+
+        Names starting with the query come first, in name order, then names
+        containing it, then (with fuzzy) names containing its characters in
+        order, tightest matches first. Matching ignores case.
+        """
+        with self._lock:
+            self._refresh()
+            # A consistent snapshot: add() and remove() replace the lists
+            icons, keys = self._icons, self._keys
+
+        query = (query or "").strip().lower()
+        if not query:
+            return [icon for icon in icons if not source or icon["source"] == source]
+
+        # Prefix matches are one contiguous run of the sorted index
+        start = bisect_left(keys, (query, ""))
+        end = start
+        while end < len(keys) and keys[end][0].startswith(query):
+            end += 1
+        prefix = icons[start:end]
+
+        contains, spans = [], []
+        for index, (name, _) in enumerate(keys):
+            if start <= index < end:
+                continue
+            if query in name:
+                contains.append(icons[index])
+            elif fuzzy:
+                span = _fuzzy_span(query, name)
+                if span is not None:
+                    spans.append((span, index))
+        spans.sort()
+
+        results = prefix + contains + [icons[index] for _, index in spans]
+        if source:
+            results = [icon for icon in results if icon["source"] == source]
+        return results
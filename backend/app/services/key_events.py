@@ -0,0 +1,183 @@
+"""Bounded async pipeline that takes key events off the HID reader thread."""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional
+import logging
+
+from .metrics import (
+    press_dispatch_seconds,
+    press_action_seconds,
+    press_render_seconds,
+    press_to_photon_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class KeyEvent:
+    """A key press or release with timestamps for each stage of handling.
+
+    Timestamps are time.perf_counter() values:
+    read_at      when the HID reader thread delivered the event
+    started_at   when the consumer picked it up
+    finished_at  when handling returned on the event loop
+    completed_at when the action finished (navigation done, dispatched action returned)
+    rendered_at  when the keys changed by the press were rendered
+    written_at   when those keys were written to the device
+    """
+    def __init__(self, serial: str, key: int, pressed: bool):
+        self.serial = serial
+        self.key = key
+        self.pressed = pressed
+        self.read_at: float = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        self.rendered_at: Optional[float] = None
+        self.written_at: Optional[float] = None
+        self.action_type: Optional[str] = None
+        self.data_source: Optional[str] = None  # of the pressed button
+
+    @property
+    def queue_ms(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.read_at) * 1000
+
+    @property
+    def handle_ms(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at) * 1000
+
+    @property
+    def total_ms(self) -> Optional[float]:
+        end = self.completed_at or self.finished_at
+        if end is None:
+            return None
+        return (end - self.read_at) * 1000
+
+    def _labels(self) -> dict:
+        return {
+            "device": self.serial,
+            "action_type": self.action_type or "none",
+            "data_source": self.data_source or "none",
+        }
+
+    def mark_completed(self):
+        """Record that the action triggered by this press has finished."""
+        self.completed_at = time.perf_counter()
+        if self.started_at is not None:
+            press_action_seconds.observe(self.completed_at - self.started_at, **self._labels())
+
+    def mark_rendered(self):
+        """Record that the keys changed by this press have been rendered."""
+        self.rendered_at = time.perf_counter()
+        press_render_seconds.observe(self.rendered_at - self.read_at, **self._labels())
+
+    def mark_written(self):
+        """Record that the keys changed by this press are on the device."""
+        self.written_at = time.perf_counter()
+        press_to_photon_seconds.observe(self.written_at - self.read_at, **self._labels())
+
+
+class KeyEventPipeline:
+    """Queues key events from the HID reader thread for a single async consumer.
+
+    The reader thread only timestamps the event and hands it to the event
+    loop. Events are handled one at a time in arrival order. When the queue
+    is full, new events are dropped and counted, so a stalled consumer can
+    never block the reader thread.
+    """
+
+    def __init__(self, handler: Callable[[KeyEvent], Awaitable[None]], maxsize: int = 64):
+        self._handler = handler
+        self._maxsize = maxsize
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[Future] = None
+        self.recent: deque = deque(maxlen=100)  # recently finished events
+
+        # Counters
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the consumer on the given event loop."""
+        if self._consumer:
+            return
+        self._loop = loop
+        self._consumer = asyncio.run_coroutine_threadsafe(self._consume(), loop)
+
+    def stop(self):
+        """Stop the consumer, dropping queued events."""
+        if self._consumer:
+            self._consumer.cancel()
+            self._consumer = None
+        self._loop = None
+        self._queue = None
+
+    def submit(self, event: KeyEvent):
+        """Hand an event to the consumer. Safe to call from any thread."""
+        loop = self._loop
+        if not loop or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._enqueue, event)
+        except RuntimeError:
+            # Loop closed while shutting down
+            pass
+
+    def stats(self) -> dict:
+        """Counters and latency summary of recently handled events."""
+        queue_times = [e.queue_ms for e in self.recent]
+        handle_times = [e.handle_ms for e in self.recent]
+        return {
+            "received": self.received,
+            "handled": self.handled,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "avg_queue_ms": round(sum(queue_times) / len(queue_times), 2) if queue_times else None,
+            "max_queue_ms": round(max(queue_times), 2) if queue_times else None,
+            "avg_handle_ms": round(sum(handle_times) / len(handle_times), 2) if handle_times else None,
+            "max_handle_ms": round(max(handle_times), 2) if handle_times else None,
+        }
+
+    def _get_queue(self) -> asyncio.Queue:
+        # Created lazily so it is bound to the loop it is used on
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._maxsize)
+        return self._queue
+
+    def _enqueue(self, event: KeyEvent):
+        self.received += 1
+        try:
+            self._get_queue().put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Key event queue full, dropped key {event.key} on {event.serial}")
+
+    async def _consume(self):
+        queue = self._get_queue()
+        while True:
+            event = await queue.get()
+            event.started_at = time.perf_counter()
+            try:
+                await self._handler(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error handling key {event.key} on {event.serial}: {e}")
+            finally:
+                event.finished_at = time.perf_counter()
+                self.handled += 1
+                self.recent.append(event)
+                if event.pressed:
+                    # Observed here as the action type is only known after handling
+                    press_dispatch_seconds.observe(event.started_at - event.read_at, **event._labels())
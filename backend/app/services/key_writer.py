@@ -0,0 +1,187 @@
+"""Per-device key image writer with a latest-wins queue."""
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from ..utils.frame_ring import KeyImage, frame_bytes, release_frame
+from .metrics import key_write_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class KeyImageWriter:
+    """Owns all key image writes for a single connected deck.
+
+    Pending images are kept per key index, so a newer image for a key replaces
+    one that has not been written yet and a burst of updates collapses into a
+    single USB write. Urgent images (key presses, page changes) are always
+    written before background ones (periodic data refreshes).
+
+    A digest of the last image written to each key is kept, and writes whose
+    bytes match what is already on the key are dropped.
+
+    Images are bytes or SharedFrames rendered into shared memory by a
+    worker process. Shared frames are sent from the shared memory and their
+    slot is released once written, dropped or replaced.
+    """
+
+    def __init__(self, deck, serial: str):
+        self.deck = deck
+        self.serial = serial
+        self._urgent: Dict[int, KeyImage] = {}
+        self._background: Dict[int, KeyImage] = {}
+        self._frame_digests: Dict[int, bytes] = {}  # key -> digest of last written image
+        self._urgent_callbacks: List[Callable] = []  # run once the urgent batch is written
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Counters
+        self.writes = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the writer thread."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"key-writer-{self.serial}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        """Stop the writer thread, dropping anything still pending."""
+        with self._cond:
+            self._running = False
+            for image in list(self._urgent.values()) + list(self._background.values()):
+                release_frame(image)
+            self._urgent.clear()
+            self._background.clear()
+            self._urgent_callbacks.clear()
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self,
+        key: int,
+        image: KeyImage,
+        urgent: bool = False,
+        on_written: Optional[Callable[[], None]] = None
+    ):
+        """Queue an image for a key, replacing any pending image for it."""
+        self.submit_many({key: image}, urgent=urgent, on_written=on_written)
+
+    def submit_many(
+        self,
+        images: Dict[int, KeyImage],
+        urgent: bool = True,
+        on_written: Optional[Callable[[], None]] = None
+    ):
+        """Queue images for several keys so they are written in one burst.
+
+        on_written is called from the writer thread once an urgent batch has
+        gone out to the device.
+        """
+        with self._cond:
+            for key, image in images.items():
+                self._put(key, image, urgent)
+            if on_written:
+                if urgent:
+                    self._urgent_callbacks.append(on_written)
+                else:
+                    logger.debug("on_written is only supported for urgent batches")
+            self._cond.notify()
+
+    def pending_count(self) -> int:
+        """Number of keys waiting to be written."""
+        with self._cond:
+            return len(self._urgent) + len(self._background)
+
+    def _put(self, key: int, image: KeyImage, urgent: bool):
+        if key in self._urgent or key in self._background:
+            self.coalesced += 1
+            release_frame(self._urgent.get(key, self._background.get(key)))
+
+        if urgent:
+            self._background.pop(key, None)
+            self._urgent[key] = image
+        elif key in self._urgent:
+            # Keep the urgency of the pending write, but newest content wins
+            self._urgent[key] = image
+        else:
+            self._background[key] = image
+
+    def _next_batch(self) -> Optional[Tuple[Dict[int, KeyImage], List[Callable]]]:
+        """Wait for pending work. Urgent keys are flushed together, background
+        keys one at a time so a new urgent write never waits for a long batch."""
+        with self._cond:
+            while self._running and not self._urgent and not self._background:
+                self._cond.wait()
+
+            if not self._running:
+                return None
+
+            if self._urgent:
+                batch, callbacks = self._urgent, self._urgent_callbacks
+                self._urgent, self._urgent_callbacks = {}, []
+                return batch, callbacks
+
+            key = next(iter(self._background))
+            return {key: self._background.pop(key)}, []
+
+    def _run(self):
+        while True:
+            work = self._next_batch()
+            if work is None:
+                return
+
+            batch, callbacks = work
+            self._write(batch)
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Error in key writer callback for {self.serial}: {e}")
+
+    def _write(self, batch: Dict[int, KeyImage]):
+        try:
+            changed = {}
+            for key, image in batch.items():
+                data = frame_bytes(image)
+                if data is None:
+                    logger.debug(f"Dropping stale shared frame for key {key} of {self.serial}")
+                    continue
+                digest = hashlib.blake2b(data, digest_size=16).digest()
+                if self._frame_digests.get(key) == digest:
+                    self.skipped += 1
+                    continue
+                changed[key] = (data, digest)
+
+            if not changed:
+                return
+
+            with self.deck:
+                for key, (data, digest) in changed.items():
+                    # Clear first so a failed write is retried next time
+                    self._frame_digests.pop(key, None)
+                    started = time.perf_counter()
+                    self.deck.set_key_image(key, data)
+                    key_write_seconds.observe(time.perf_counter() - started, device=self.serial)
+                    self._frame_digests[key] = digest
+                    self.writes += 1
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"Error writing key images to {self.serial}: {e}")
+        finally:
+            for image in batch.values():
+                release_frame(image)
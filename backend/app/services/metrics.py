@@ -0,0 +1,200 @@
+"""Latency histograms and counters exposed in the Prometheus text format."""
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Bucket upper bounds in seconds, from sub-millisecond renders to slow actions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of label names."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple, List] = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        """Record a value, in seconds for latency histograms."""
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+        for values, (counts, total, count) in sorted(series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time.
+
+    The callback returns a dict mapping label value tuples to values.
+    """
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], callback: Callable[[], Dict[Tuple, float]], type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.type = type
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self.callback().items())
+        ]
+
+
+class MetricsRegistry:
+    """Holds all metrics and renders them for the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def callback(self, name: str, help: str, labelnames: Sequence[str], callback: Callable[[], Dict[Tuple, float]], type: str = "gauge") -> CallbackMetric:
+        """Register a callback metric, replacing an earlier one of the same name."""
+        metric = CallbackMetric(name, help, labelnames, callback, type)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                lines.append(f"# error collecting {metric.name}: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Key press stages, from the HID reader callback to the USB write of the result
+press_dispatch_seconds = metrics.histogram(
+    "streamdeck_press_dispatch_seconds",
+    "Time from the HID callback until the key event is dispatched",
+    ["device", "action_type", "data_source"]
+)
+press_action_seconds = metrics.histogram(
+    "streamdeck_press_action_seconds",
+    "Time from dispatch until the triggered action completed",
+    ["device", "action_type", "data_source"]
+)
+press_render_seconds = metrics.histogram(
+    "streamdeck_press_render_seconds",
+    "Time from the HID callback until the keys changed by the press are rendered",
+    ["device", "action_type", "data_source"]
+)
+press_to_photon_seconds = metrics.histogram(
+    "streamdeck_press_to_photon_seconds",
+    "Time from the HID callback until the keys changed by the press are written to the device",
+    ["device", "action_type", "data_source"]
+)
+
+# Per key rendering and USB writes
+key_render_seconds = metrics.histogram(
+    "streamdeck_key_render_seconds",
+    "Time to render one key image, including its data source fetch",
+    ["device", "data_source"]
+)
+key_write_seconds = metrics.histogram(
+    "streamdeck_key_write_seconds",
+    "Time to write one key image to the device",
+    ["device"]
+)
+data_fetch_seconds = metrics.histogram(
+    "streamdeck_data_fetch_seconds",
+    "Time to fetch the value of a data source",
+    ["data_source"]
+)
+page_switch_seconds = metrics.histogram(
+    "streamdeck_page_switch_seconds",
+    "Time from starting to render a page until all its keys are written",
+    ["device"]
+)
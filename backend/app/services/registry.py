@@ -0,0 +1,136 @@
+"""In-memory registry of devices, profiles and buttons for the key press path."""
+import json
+import threading
+from typing import Dict, Optional
+from sqlalchemy.orm import Session, joinedload
+import logging
+
+from ..models.device import Device
+from ..models.button import Button
+from ..models.action import Action
+
+logger = logging.getLogger(__name__)
+
+
+class ActionSnapshot:
+    """Detached copy of an Action row, safe to use from any thread."""
+    def __init__(self, action: Action):
+        self.id = action.id
+        self.name = action.name
+        self.action_type = action.action_type
+        self.config = json.loads(action.config) if isinstance(action.config, str) else (action.config or {})
+
+
+class ButtonSnapshot:
+    """Detached copy of a Button row with its resolved action."""
+    def __init__(self, button: Button):
+        for column in Button.__table__.columns:
+            setattr(self, column.name, getattr(button, column.name))
+        self.action: Optional[ActionSnapshot] = ActionSnapshot(button.action) if button.action else None
+
+
+class DeviceEntry:
+    """Registry entry for a known device."""
+    def __init__(self, device_id: str, active_profile_id: Optional[str]):
+        self.device_id = device_id
+        self.active_profile_id = active_profile_id
+
+
+class DeviceRegistry:
+    """Keeps device -> active profile -> page -> button (+ action) in memory.
+
+    Loaded once at startup and kept in sync by the routers that change
+    devices, profiles, buttons and actions, so a key press can be resolved
+    without touching the database. Pages are replaced as a whole, never
+    mutated in place, so readers on other threads always see a consistent
+    page.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._devices: Dict[str, DeviceEntry] = {}  # serial -> DeviceEntry
+        self._profiles: Dict[str, Dict[int, Dict[int, ButtonSnapshot]]] = {}  # profile_id -> page -> position -> button
+
+    def load(self, db: Session):
+        """Load all devices and profiles from the database."""
+        devices = {
+            device.serial_number: DeviceEntry(device.id, device.active_profile_id)
+            for device in db.query(Device).all()
+        }
+        buttons = db.query(Button).options(joinedload(Button.action)).all()
+
+        profiles: Dict[str, Dict[int, Dict[int, ButtonSnapshot]]] = {}
+        for button in buttons:
+            pages = profiles.setdefault(button.profile_id, {})
+            pages.setdefault(button.page or 0, {})[button.position] = ButtonSnapshot(button)
+
+        with self._lock:
+            self._devices = devices
+            self._profiles = profiles
+        logger.info(f"Registry loaded {len(devices)} devices and {len(profiles)} profiles")
+
+    # Devices
+
+    def set_device(self, serial: str, device_id: str, active_profile_id: Optional[str]):
+        """Add or update a device entry."""
+        with self._lock:
+            self._devices[serial] = DeviceEntry(device_id, active_profile_id)
+
+    def set_active_profile(self, serial: str, profile_id: Optional[str]):
+        """Switch the active profile of a known device."""
+        with self._lock:
+            entry = self._devices.get(serial)
+            if entry:
+                entry.active_profile_id = profile_id
+
+    def get_device_id(self, serial: str) -> Optional[str]:
+        entry = self._devices.get(serial)
+        return entry.device_id if entry else None
+
+    def get_active_profile_id(self, serial: str) -> Optional[str]:
+        entry = self._devices.get(serial)
+        return entry.active_profile_id if entry else None
+
+    # Profiles
+
+    def reload_profile(self, db: Session, profile_id: str):
+        """Reload every button of a profile from the database."""
+        buttons = db.query(Button).options(joinedload(Button.action)).filter(
+            Button.profile_id == profile_id
+        ).all()
+
+        pages: Dict[int, Dict[int, ButtonSnapshot]] = {}
+        for button in buttons:
+            pages.setdefault(button.page or 0, {})[button.position] = ButtonSnapshot(button)
+
+        with self._lock:
+            self._profiles[profile_id] = pages
+
+    def reload_action(self, db: Session, action_id: str):
+        """Reload every profile with a button using the given action."""
+        rows = db.query(Button.profile_id).filter(Button.action_id == action_id).distinct().all()
+        for (profile_id,) in rows:
+            self.reload_profile(db, profile_id)
+
+    def remove_profile(self, profile_id: str):
+        """Forget a deleted profile."""
+        with self._lock:
+            self._profiles.pop(profile_id, None)
+            for entry in self._devices.values():
+                if entry.active_profile_id == profile_id:
+                    entry.active_profile_id = None
+
+    def get_page(self, profile_id: str, page: int) -> Dict[int, ButtonSnapshot]:
+        """Get the buttons of a page, keyed by position."""
+        return self._profiles.get(profile_id, {}).get(page, {})
+
+    def get_button(self, profile_id: str, page: int, position: int) -> Optional[ButtonSnapshot]:
+        return self.get_page(profile_id, page).get(position)
+
+    def get_max_page(self, profile_id: str) -> int:
+        """Get the highest page number of a profile."""
+        pages = self._profiles.get(profile_id)
+        return max(pages) if pages else 0
+
+
+device_registry = DeviceRegistry()
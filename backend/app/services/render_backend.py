@@ -0,0 +1,199 @@
+"""Render backends: in-process threads, or a pool of worker processes."""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Union
+import logging
+
+from ..config import settings
+from ..utils.frame_ring import FrameRing, KeyImage
+from ..utils.image import image_renderer
+from ..utils.render_worker import RenderJob, render_job, render_native
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadRenderBackend:
+    """Renders in the calling thread, inside the server process."""
+    name = "thread"
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def attach(self, serial: str, deck):
+        pass
+
+    def detach(self, serial: str):
+        pass
+
+    def render_key(self, deck, **inputs) -> bytes:
+        return image_renderer.render_key_image(deck, **inputs)
+
+    def render_frame(self, serial: str, deck, **inputs) -> KeyImage:
+        return image_renderer.render_key_image(deck, **inputs)
+
+    def render_blank(self, deck, color: str = "#000000") -> bytes:
+        return image_renderer.render_blank_key(deck, color)
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class ProcessRenderBackend:
+    """Renders in worker processes so rendering does not compete for the GIL
+    with the HID readers, the event loop and the REST API.
+
+    Only the render inputs travel to a worker, and native image bytes come
+    back. Each worker keeps its own icon, layer and font caches. Finished
+    images are also cached in this process, so unchanged keys never make
+    the round trip. If the pool breaks, rendering falls back to this
+    process until the pool has been recreated.
+
+    Frames that go straight to a device, such as data refreshes, are
+    written by the worker into the device's shared-memory FrameRing, and
+    only a descriptor comes back over the pipe.
+    """
+    name = "process"
+
+    def __init__(self, processes: int = 2):
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._rings: Dict[str, FrameRing] = {}  # serial -> FrameRing
+        self._lock = threading.Lock()
+
+        # Counters
+        self.jobs = 0
+        self.cache_hits = 0
+        self.fallbacks = 0
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork, this process runs HID reader and other threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        logger.info(f"Rendering in {self.processes} worker processes")
+
+    def stop(self):
+        self._shutdown_pool()
+        with self._lock:
+            rings, self._rings = self._rings, {}
+        for ring in rings.values():
+            ring.close()
+
+    def _shutdown_pool(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def attach(self, serial: str, deck):
+        """Create the shared-memory ring for a connected device."""
+        width, height = deck.key_image_format()["size"]
+        try:
+            # Two frames per key: one being written to the deck, one waiting
+            ring = FrameRing(serial, slots=2 * deck.key_count(), slot_size=width * height * 3 + 1024)
+        except OSError as e:
+            logger.warning(f"No shared memory for {serial}, frames go over the worker pipe: {e}")
+            return
+        with self._lock:
+            old = self._rings.pop(serial, None)
+            self._rings[serial] = ring
+        if old:
+            old.close()
+
+    def detach(self, serial: str):
+        """Remove a disconnected device's ring."""
+        with self._lock:
+            ring = self._rings.pop(serial, None)
+        if ring:
+            ring.close()
+
+    def render_key(self, deck, **inputs) -> bytes:
+        cache_key = image_renderer.key_image_cache_key(deck, **inputs)
+        native = image_renderer.key_cache.get(cache_key)
+        if native is not None:
+            self.cache_hits += 1
+            return native
+
+        native = self._run(RenderJob(deck.key_image_format(), **inputs))
+        image_renderer.key_cache.put(cache_key, native)
+        return native
+
+    def render_blank(self, deck, color: str = "#000000") -> bytes:
+        cache_key = image_renderer.blank_key_cache_key(deck, color)
+        native = image_renderer.key_cache.get(cache_key)
+        if native is not None:
+            self.cache_hits += 1
+            return native
+
+        native = self._run(RenderJob(deck.key_image_format(), blank=True, background_color=color))
+        image_renderer.key_cache.put(cache_key, native)
+        return native
+
+    def render_frame(self, serial: str, deck, **inputs) -> KeyImage:
+        """Render a key image that is written to the device right away.
+
+        Returns a SharedFrame in the device's ring, which the key writer
+        releases once written. These frames are not kept in the finished key
+        cache, their labels rarely repeat.
+        """
+        ring = self._rings.get(serial)
+        acquired = ring.acquire() if ring and self._executor else None
+        if acquired is None:
+            return self.render_key(deck, **inputs)
+
+        slot, seq = acquired
+        try:
+            job = RenderJob(deck.key_image_format(), slot=(ring.name, ring.stride, slot, seq), **inputs)
+            result = self._run(job)
+        except BaseException:
+            ring.release(slot)
+            raise
+
+        if isinstance(result, int):
+            return ring.frame(slot, seq, result)
+        ring.release(slot)
+        return result
+
+    def _run(self, job: RenderJob) -> Union[bytes, int]:
+        executor = self._executor
+        if executor is not None:
+            try:
+                self.jobs += 1
+                return executor.submit(render_job, job).result()
+            except BrokenProcessPool:
+                logger.error("Render worker pool broke, restarting it")
+                self._shutdown_pool()
+                self.start()
+            except RuntimeError:
+                # Pool shut down while the service is stopping
+                pass
+
+        self.fallbacks += 1
+        return render_native(job)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "processes": self.processes,
+            "jobs": self.jobs,
+            "cache_hits": self.cache_hits,
+            "fallbacks": self.fallbacks,
+            "frame_rings": {serial: ring.stats() for serial, ring in list(self._rings.items())},
+        }
+
+
+def create_render_backend():
+    """Create the configured render backend."""
+    if settings.render_backend == "process":
+        return ProcessRenderBackend(settings.render_processes)
+    if settings.render_backend != "thread":
+        logger.warning(f"Unknown render backend '{settings.render_backend}', rendering in threads")
+    return ThreadRenderBackend()
@@ -0,0 +1,188 @@
+"""Heap-based scheduler for periodic device work (data refreshes, flashes)."""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANE = "default"
+
+
+class ScheduledJob:
+    """A single scheduled call, optionally repeating."""
+    def __init__(self, job_id: int, func: Callable, interval: Optional[float], lane: str, tags: Dict[str, Any]):
+        self.id = job_id
+        self.func = func
+        self.interval = interval  # seconds between runs, None for one-shot
+        self.lane = lane
+        self.tags = tags
+        self.cancelled = False
+
+    def matches(self, tags: Dict[str, Any]) -> bool:
+        return all(self.tags.get(k) == v for k, v in tags.items())
+
+
+class Scheduler:
+    """Runs all timed work from one heap and one timer thread.
+
+    Due jobs are handed to a small fixed worker pool, so a slow job never
+    delays the timer and no thread is created per tick. Each lane has its
+    own pool: blocking data fetches fill only their lane, and short jobs
+    such as identify flashes and settings writes in another lane still run
+    on time. Repeating jobs are re-armed after each run finishes, so a job
+    never overlaps with itself. Jobs carry free-form tags (serial, page,
+    position, ...) which can be used to cancel or count them as a group.
+    """
+
+    def __init__(self, lanes: Optional[Dict[str, int]] = None):
+        self._lanes = dict(lanes or {DEFAULT_LANE: 4})  # lane -> worker threads
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._jobs: Dict[int, ScheduledJob] = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+
+    def start(self):
+        """Start the timer thread and the lanes' worker pools."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executors = {
+                lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"scheduler-{lane}")
+                for lane, workers in self._lanes.items()
+            }
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Scheduler started")
+
+    def stop(self):
+        """Stop the scheduler and drop all pending jobs."""
+        with self._cond:
+            self._running = False
+            for job in self._jobs.values():
+                job.cancelled = True
+            self._jobs.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+            executors, self._executors = self._executors, {}
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("Scheduler stopped")
+
+    def schedule(
+        self,
+        delay: float,
+        func: Callable,
+        interval: Optional[float] = None,
+        lane: str = DEFAULT_LANE,
+        **tags
+    ) -> int:
+        """Run func after delay seconds, then every interval seconds if given,
+        on a worker of the given lane.
+
+        Returns a job id that can be passed to cancel().
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown scheduler lane '{lane}'")
+        with self._cond:
+            job = ScheduledJob(next(self._ids), func, interval, lane, tags)
+            self._jobs[job.id] = job
+            self._push(job, time.monotonic() + max(delay, 0.0))
+            return job.id
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a job. Returns False if it was not pending."""
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if not job:
+                return False
+            job.cancelled = True
+            return True
+
+    def cancel_where(self, **tags) -> int:
+        """Cancel every job whose tags match all given tags, e.g. serial=...
+        or serial=..., page=.... Returns the number of cancelled jobs."""
+        with self._cond:
+            matched = [job for job in self._jobs.values() if job.matches(tags)]
+            for job in matched:
+                job.cancelled = True
+                del self._jobs[job.id]
+            return len(matched)
+
+    def pending_count(self, **tags) -> int:
+        """Number of pending jobs, optionally filtered by tags."""
+        with self._cond:
+            if not tags:
+                return len(self._jobs)
+            return sum(1 for job in self._jobs.values() if job.matches(tags))
+
+    def _push(self, job: ScheduledJob, run_at: float):
+        heapq.heappush(self._heap, (run_at, job.id, job))
+        # Wake the timer thread in case this job is now the earliest
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    # Discard cancelled jobs at the top of the heap
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+
+                if not self._running:
+                    return
+
+                _, _, job = heapq.heappop(self._heap)
+                if job.interval is None:
+                    self._jobs.pop(job.id, None)
+                executor = self._executors[job.lane]
+
+            try:
+                executor.submit(self._execute, job)
+            except RuntimeError:
+                # Executor shut down while stopping
+                return
+
+    def _execute(self, job: ScheduledJob):
+        if job.cancelled:
+            return
+
+        try:
+            job.func()
+        except Exception as e:
+            logger.error(f"Scheduled job {job.id} failed: {e}")
+
+        if job.interval is not None:
+            with self._cond:
+                if self._running and not job.cancelled:
+                    self._push(job, time.monotonic() + job.interval)
+
+
+scheduler = Scheduler({
+    DEFAULT_LANE: settings.scheduler_workers,
+    "data": settings.data_refresh_workers,
+    # One tick at a time; data fetches can never hold up playback
+    "animation": 1,
+})
@@ -1,18 +1,28 @@
 import asyncio
 import threading
-import json
-from typing import Dict, Optional, Callable, Any, List
-from StreamDeck.DeviceManager import DeviceManager
-from StreamDeck.Transport.Transport import TransportError
-from sqlalchemy.orm import Session
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Callable, Any, Tuple
+from StreamDeck.DeviceManager import DeviceManager, ProbeError
 import logging
 
 from ..models.device import Device
-from ..models.profile import Profile
-from ..models.button import Button
+from ..config import settings
 from ..utils.image import image_renderer
+from ..utils.frame_ring import KeyImage
+from .render_backend import ThreadRenderBackend, create_render_backend
 from .websocket import websocket_manager
 from .data_fetcher import data_fetcher
+from .key_writer import KeyImageWriter
+from .scheduler import scheduler
+from .registry import device_registry, ButtonSnapshot
+from .hotplug import HotplugEventSource, PollingEventSource, create_event_source
+from .key_events import KeyEvent, KeyEventPipeline
+from .virtual_deck import create_virtual_device_manager
+from .metrics import metrics, key_render_seconds, data_fetch_seconds, page_switch_seconds
+from .animation import animation_engine
 
 logger = logging.getLogger(__name__)
 
@@ -22,18 +32,95 @@ class DeviceState:
     def __init__(self):
         self.current_page: int = 0
         self.folder_stack: list = []  # Stack of (profile_id, page) tuples for back navigation
-        self.data_refresh_timers: Dict[int, threading.Timer] = {}  # position -> Timer
+        self.data_refresh_jobs: Dict[int, int] = {}  # position -> scheduler job id
+        self.page_switch_ms: deque = deque(maxlen=50)  # recent render-to-flush times
+        # Native images of pages likely to be shown next, for keys without live data
+        self.prerendered: Dict[Tuple[str, int], Dict[int, bytes]] = {}  # (profile_id, page) -> position -> image
+        self.prerender_generation: int = 0  # bumped on invalidation to discard in-flight prerenders
+        # On/off state of toggle keys, flipped on each press; unknown until the first press
+        self.toggle_states: Dict[Tuple[str, int, int], bool] = {}  # (profile_id, page, position) -> on
 
 
 class StreamDeckService:
-    def __init__(self):
-        self.device_manager = DeviceManager()
+    # Delay after a hotplug event so the burst of udev events for one plug causes a single scan
+    HOTPLUG_DEBOUNCE = 0.05
+
+    def __init__(self, event_source: Optional[HotplugEventSource] = None, device_manager=None):
+        # Created on start() unless given, e.g. a VirtualDeviceManager
+        self.device_manager = device_manager
+        self.event_source = event_source
         self.connected_decks: Dict[str, Any] = {}  # serial -> deck object
+        self._deck_paths: Dict[str, str] = {}  # HID path -> serial of open decks
+        self._scan_requested = threading.Event()
         self.device_states: Dict[str, DeviceState] = {}  # serial -> DeviceState
+        self.key_writers: Dict[str, KeyImageWriter] = {}  # serial -> KeyImageWriter
         self._running = False
         self._monitor_thread: Optional[threading.Thread] = None
         self._db_session_factory: Optional[Callable] = None
         self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Key events are handled on the event loop, not on the HID reader threads
+        self.key_events = KeyEventPipeline(self._handle_key_event, maxsize=settings.key_event_queue_size)
+        # Bounded pool for rendering all keys of a page concurrently
+        self._render_pool = ThreadPoolExecutor(
+            max_workers=settings.render_workers,
+            thread_name_prefix="render"
+        )
+        # Work that can wait (building animation frame sets, prerendering
+        # pages) runs one job at a time on its own thread, so it never holds
+        # up the render of the page being shown
+        self._background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        # Renders in this process until start() creates the configured backend
+        self.renderer = ThreadRenderBackend()
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Expose writer, key event and scheduler counters on /metrics."""
+        def per_writer(attr):
+            return lambda: {(serial,): getattr(w, attr) for serial, w in list(self.key_writers.items())}
+
+        metrics.callback("streamdeck_connected_devices", "Number of connected decks", [],
+                         lambda: {(): len(self.connected_decks)})
+        metrics.callback("streamdeck_key_writes_total", "Key images written to the device", ["device"],
+                         per_writer("writes"), type="counter")
+        metrics.callback("streamdeck_key_writes_skipped_total", "Key images not written as the key already showed them",
+                         ["device"], per_writer("skipped"), type="counter")
+        metrics.callback("streamdeck_key_writes_coalesced_total", "Pending key images replaced by a newer one",
+                         ["device"], per_writer("coalesced"), type="counter")
+        metrics.callback("streamdeck_key_write_errors_total", "Failed key image writes", ["device"],
+                         per_writer("errors"), type="counter")
+        metrics.callback("streamdeck_key_writes_pending", "Key images waiting to be written", ["device"],
+                         lambda: {(serial,): w.pending_count() for serial, w in list(self.key_writers.items())})
+        metrics.callback("streamdeck_key_events_total", "Key events by outcome", ["outcome"],
+                         lambda: {
+                             ("received",): self.key_events.received,
+                             ("handled",): self.key_events.handled,
+                             ("dropped",): self.key_events.dropped,
+                             ("failed",): self.key_events.failed,
+                         }, type="counter")
+        metrics.callback("streamdeck_key_events_queued", "Key events waiting to be handled", [],
+                         lambda: {(): self.key_events.stats()["queued"]})
+        metrics.callback("streamdeck_scheduler_jobs_pending", "Jobs waiting on the shared scheduler", [],
+                         lambda: {(): scheduler.pending_count()})
+        metrics.callback("streamdeck_animation_frames_total", "Animation frames by outcome", ["outcome"],
+                         lambda: {
+                             ("written",): animation_engine.frames_written,
+                             ("deferred",): animation_engine.frames_deferred,
+                         }, type="counter")
+
+        caches = {
+            "key": image_renderer.key_cache,
+            "base_layer": image_renderer.base_cache,
+            "icon": image_renderer.icon_cache,
+        }
+        for attr, name, help in (
+            ("hits", "streamdeck_render_cache_hits_total", "Render cache lookups that found an entry"),
+            ("misses", "streamdeck_render_cache_misses_total", "Render cache lookups that missed"),
+            ("evictions", "streamdeck_render_cache_evictions_total", "Entries evicted to stay within the byte budget"),
+            ("current_bytes", "streamdeck_render_cache_bytes", "Memory used by render cache entries"),
+        ):
+            metrics.callback(name, help, ["cache"],
+                             lambda attr=attr: {(n,): getattr(c, attr) for n, c in caches.items()},
+                             type="gauge" if attr == "current_bytes" else "counter")
 
     def set_db_session_factory(self, factory: Callable):
         """Set the database session factory for background operations."""
@@ -48,20 +135,62 @@ class StreamDeckService:
         if self._running:
             return
 
+        if self.device_manager is None:
+            try:
+                self.device_manager = self._create_device_manager()
+            except ProbeError as e:
+                logger.error(f"No Stream Deck transport available, device support disabled: {e}")
+                return
+
         self._running = True
+        self.renderer = create_render_backend()
+        self.renderer.start()
+        scheduler.start()
+        if self._loop:
+            self.key_events.start(self._loop)
+
+        if self.event_source is None and hasattr(self.device_manager, "event_source"):
+            # Virtual decks report plug and unplug themselves
+            self.event_source = self.device_manager.event_source
+        if self.event_source is None:
+            self.event_source = create_event_source()
+        try:
+            self.event_source.start(self.request_scan)
+        except Exception as e:
+            logger.error(f"Hotplug source '{self.event_source.name}' failed, falling back to polling: {e}")
+            self.event_source = PollingEventSource(settings.hotplug_poll_interval)
+            self.event_source.start(self.request_scan)
+
         self._monitor_thread = threading.Thread(target=self._monitor_devices, daemon=True)
         self._monitor_thread.start()
-        logger.info("Stream Deck monitoring service started")
+        logger.info(f"Stream Deck monitoring service started ({self.event_source.name} hotplug)")
+
+    def _create_device_manager(self):
+        """Create the USB device manager, or a virtual one if configured."""
+        if settings.virtual_decks > 0:
+            return create_virtual_device_manager(
+                settings.virtual_decks,
+                model=settings.virtual_deck_model,
+                write_latency=settings.virtual_deck_write_latency_ms / 1000.0
+            )
+        return DeviceManager()
 
     def stop(self):
         """Stop the Stream Deck monitoring service."""
         self._running = False
+        if self.event_source:
+            self.event_source.stop()
+        self._scan_requested.set()
+        self.key_events.stop()
 
-        # Cancel all data refresh timers
-        for serial, state in self.device_states.items():
-            for timer in state.data_refresh_timers.values():
-                timer.cancel()
-            state.data_refresh_timers.clear()
+        # Cancel all data refreshes and other scheduled device work
+        scheduler.stop()
+
+        animation_engine.stop()
+        for writer in self.key_writers.values():
+            writer.stop()
+        self.key_writers.clear()
+        self.renderer.stop()
 
         for serial, deck in list(self.connected_decks.items()):
             try:
@@ -70,55 +199,65 @@ class StreamDeckService:
             except Exception as e:
                 logger.error(f"Error closing deck {serial}: {e}")
         self.connected_decks.clear()
+        self._deck_paths.clear()
         self.device_states.clear()
         logger.info("Stream Deck monitoring service stopped")
 
+    def request_scan(self):
+        """Ask the monitor thread to rescan, called by the hotplug event source."""
+        self._scan_requested.set()
+
     def _monitor_devices(self):
-        """Background thread to monitor device connections."""
+        """Background thread that rescans whenever a hotplug event arrives."""
+        self._scan_requested.set()  # Initial scan
         while self._running:
+            self._scan_requested.wait()
+            if not self._running:
+                break
+
+            # Let the rest of a burst of events arrive before scanning
+            threading.Event().wait(self.HOTPLUG_DEBOUNCE)
+            self._scan_requested.clear()
+
             try:
                 self._scan_devices()
             except Exception as e:
                 logger.error(f"Error scanning devices: {e}")
 
-            # Sleep for a bit before next scan
-            threading.Event().wait(2.0)
-
     def _scan_devices(self):
-        """Scan for new devices and detect disconnections."""
+        """Open new devices and detect disconnections.
+
+        Decks are matched by HID path, so already connected decks cause no HID
+        traffic at all.
+        """
         try:
             decks = self.device_manager.enumerate()
         except Exception as e:
             logger.error(f"Failed to enumerate devices: {e}")
             return
 
-        current_serials = set()
+        present_paths = set()
 
         for deck in decks:
             if not deck.is_visual():
                 continue
 
-            try:
-                # Check if already connected by trying to match via device path
-                already_open = False
-                for serial, existing_deck in self.connected_decks.items():
-                    try:
-                        # If we can still communicate, it's connected
-                        existing_deck.get_serial_number()
-                        current_serials.add(serial)
-                        already_open = True
-                    except Exception:
-                        pass
-
-                if already_open:
-                    continue
+            path = deck.id()
+            present_paths.add(path)
+            if path in self._deck_paths:
+                continue
 
+            try:
                 deck.open()
                 serial = deck.get_serial_number()
-                current_serials.add(serial)
 
-                if serial not in self.connected_decks:
-                    self._on_device_connected(deck, serial)
+                if serial in self.connected_decks:
+                    # Same deck re-enumerated under a new path
+                    self._forget_path(serial)
+                    self._on_device_disconnected(serial)
+
+                self._deck_paths[path] = serial
+                self._on_device_connected(deck, serial)
             except Exception as e:
                 # Only log once per scan cycle to avoid spam
                 if not hasattr(self, '_last_error') or self._last_error != str(e):
@@ -129,9 +268,15 @@ class StreamDeckService:
                         logger.error(f"Error opening deck: {e}")
 
         # Check for disconnections
-        disconnected = set(self.connected_decks.keys()) - current_serials
-        for serial in disconnected:
-            self._on_device_disconnected(serial)
+        for path, serial in list(self._deck_paths.items()):
+            if path not in present_paths:
+                del self._deck_paths[path]
+                self._on_device_disconnected(serial)
+
+    def _forget_path(self, serial: str):
+        for path, path_serial in list(self._deck_paths.items()):
+            if path_serial == serial:
+                del self._deck_paths[path]
 
     def _on_device_connected(self, deck, serial: str):
         """Handle a newly connected device."""
@@ -139,6 +284,11 @@ class StreamDeckService:
         self.connected_decks[serial] = deck
         self.device_states[serial] = DeviceState()
 
+        writer = KeyImageWriter(deck, serial)
+        self.key_writers[serial] = writer
+        writer.start()
+        self.renderer.attach(serial, deck)
+
         # Set up the deck
         deck.set_brightness(50)
         deck.set_key_callback(lambda d, k, s: self._key_callback(serial, k, s))
@@ -160,11 +310,13 @@ class StreamDeckService:
                     db.commit()
                     db.refresh(device)
 
+                device_registry.set_device(serial, device.id, device.active_profile_id)
+
                 # Load active profile if set
                 if device.active_profile_id:
-                    self._apply_profile(db, device, deck)
+                    self._apply_profile(serial, deck)
                 else:
-                    self._apply_default_layout(deck)
+                    self._apply_default_layout(serial, deck)
 
                 # Notify via WebSocket
                 if self._loop:
@@ -186,12 +338,17 @@ class StreamDeckService:
         logger.info(f"Device disconnected: {serial}")
         deck = self.connected_decks.pop(serial, None)
         state = self.device_states.pop(serial, None)
+        writer = self.key_writers.pop(serial, None)
 
-        # Cancel all data refresh timers for this device
+        # Cancel all scheduled work for this device
+        scheduler.cancel_where(serial=serial)
+        animation_engine.clear_device(serial)
         if state:
-            for timer in state.data_refresh_timers.values():
-                timer.cancel()
-            state.data_refresh_timers.clear()
+            state.data_refresh_jobs.clear()
+
+        if writer:
+            writer.stop()
+        self.renderer.detach(serial)
 
         if deck:
             try:
@@ -200,102 +357,115 @@ class StreamDeckService:
                 pass
 
         # Notify via WebSocket
-        if self._loop and self._db_session_factory:
-            db = self._db_session_factory()
-            try:
-                device = db.query(Device).filter(Device.serial_number == serial).first()
-                if device:
-                    asyncio.run_coroutine_threadsafe(
-                        websocket_manager.send_device_disconnected(device.id),
-                        self._loop
-                    )
-            finally:
-                db.close()
+        device_id = device_registry.get_device_id(serial)
+        if self._loop and device_id:
+            asyncio.run_coroutine_threadsafe(
+                websocket_manager.send_device_disconnected(device_id),
+                self._loop
+            )
 
     def _key_callback(self, serial: str, key: int, state: bool):
-        """Handle key press/release events."""
-        if self._loop:
-            # Get profile_id for this device
-            profile_id = None
-            if self._db_session_factory:
-                db = self._db_session_factory()
-                try:
-                    device = db.query(Device).filter(Device.serial_number == serial).first()
-                    if device:
-                        profile_id = device.active_profile_id
-                finally:
-                    db.close()
+        """Handle key press/release events from the HID reader thread.
 
-            if state:
-                asyncio.run_coroutine_threadsafe(
-                    websocket_manager.send_button_pressed(serial, key, profile_id),
-                    self._loop
-                )
-                # Execute action
-                self._execute_button_action(serial, key)
-            else:
-                asyncio.run_coroutine_threadsafe(
-                    websocket_manager.send_button_released(serial, key, profile_id),
-                    self._loop
-                )
+        Only timestamps the event and queues it, so the reader can go straight
+        back to reading the next report.
+        """
+        self.key_events.submit(KeyEvent(serial, key, state))
 
-    def _execute_button_action(self, serial: str, key: int):
-        """Execute the action associated with a button."""
-        if not self._db_session_factory:
-            return
+    async def _handle_key_event(self, event: KeyEvent):
+        """Handle a queued key event on the event loop."""
+        profile_id = device_registry.get_active_profile_id(event.serial)
+
+        if event.pressed:
+            asyncio.ensure_future(
+                websocket_manager.send_button_pressed(event.serial, event.key, profile_id)
+            )
+            # Navigation and rendering block, so run them off the loop
+            await asyncio.to_thread(self._execute_button_action, event.serial, event.key, event)
+        else:
+            asyncio.ensure_future(
+                websocket_manager.send_button_released(event.serial, event.key, profile_id)
+            )
+
+    def _execute_button_action(self, serial: str, key: int, event: Optional[KeyEvent] = None):
+        """Execute the action associated with a button.
 
-        db = self._db_session_factory()
+        The press's event is marked completed on every path, including
+        buttons without an action and failed actions.
+        """
+        deferred = False
         try:
-            device = db.query(Device).filter(Device.serial_number == serial).first()
-            if not device or not device.active_profile_id:
-                return
+            deferred = self._run_button_action(serial, key, event)
+        finally:
+            if event and not deferred:
+                event.mark_completed()
 
-            state = self.device_states.get(serial)
-            current_page = state.current_page if state else 0
+    def _run_button_action(self, serial: str, key: int, event: Optional[KeyEvent] = None) -> bool:
+        """Run a button's action; True if it was dispatched and marks the event completed itself."""
+        profile_id = device_registry.get_active_profile_id(serial)
+        if not profile_id:
+            return False
 
-            # Get button for current page
-            button = db.query(Button).filter(
-                Button.profile_id == device.active_profile_id,
-                Button.position == key,
-                Button.page == current_page
-            ).first()
+        state = self.device_states.get(serial)
+        current_page = state.current_page if state else 0
 
-            # Handle data source button presses (counter/timer)
-            if button and button.data_source in ("counter", "timer"):
-                self._handle_data_button_press(serial, device, button, current_page, db)
-                return
+        # Get button for current page
+        button = device_registry.get_button(profile_id, current_page, key)
+        if button:
+            if event:
+                event.data_source = button.data_source
+            self._animate_press(serial, profile_id, current_page, button)
+
+        # Handle data source button presses (counter/timer)
+        if button and button.data_source in ("counter", "timer"):
+            if event:
+                event.action_type = button.data_source
+            self._handle_data_button_press(serial, profile_id, button, current_page, event)
+            return False
 
-            if button and button.action_id:
-                from .action_executor import action_executor
-                action = button.action
-                if action:
-                    # Handle navigation actions locally
-                    action_type = action.action_type
-                    config = json.loads(action.config) if isinstance(action.config, str) else action.config
-
-                    if action_type == "next_page":
-                        self._navigate_page(serial, device, db, 1)
-                    elif action_type == "prev_page":
-                        self._navigate_page(serial, device, db, -1)
-                    elif action_type == "go_to_page":
-                        target_page = config.get("page", 0)
-                        self._go_to_page(serial, device, db, target_page)
-                    elif action_type == "open_folder":
-                        folder_profile_id = config.get("profile_id")
-                        if folder_profile_id:
-                            self._open_folder(serial, device, db, folder_profile_id)
-                    elif action_type == "go_back":
-                        self._go_back(serial, device, db)
-                    else:
-                        # Execute other actions normally
-                        asyncio.run_coroutine_threadsafe(
-                            action_executor.execute(action),
-                            self._loop
-                        )
-        finally:
-            db.close()
+        if button and button.action:
+            from .action_executor import action_executor
+            action = button.action
+
+            # Handle navigation actions locally
+            action_type = action.action_type
+            config = action.config
+            if event:
+                event.action_type = action_type
+
+            if action_type == "next_page":
+                self._navigate_page(serial, 1, event)
+            elif action_type == "prev_page":
+                self._navigate_page(serial, -1, event)
+            elif action_type == "go_to_page":
+                target_page = config.get("page", 0)
+                self._go_to_page(serial, target_page, event)
+            elif action_type == "open_folder":
+                folder_profile_id = config.get("profile_id")
+                if folder_profile_id:
+                    self._open_folder(serial, folder_profile_id, event)
+            elif action_type == "go_back":
+                self._go_back(serial, event)
+            else:
+                # Execute other actions normally, without waiting for them
+                future = asyncio.run_coroutine_threadsafe(
+                    action_executor.execute(action),
+                    self._loop
+                )
+                if event:
+                    future.add_done_callback(lambda f: event.mark_completed())
+                return True
 
-    def _handle_data_button_press(self, serial: str, device: Device, button: Button, current_page: int, db: Session):
+        return False
+
+    def _handle_data_button_press(
+        self,
+        serial: str,
+        profile_id: str,
+        button: ButtonSnapshot,
+        current_page: int,
+        event: Optional[KeyEvent] = None
+    ):
         """Handle button press for counter/timer data source buttons."""
         from .button_state import button_state_service
 
@@ -303,7 +473,6 @@ class StreamDeckService:
         if not deck:
             return
 
-        profile_id = device.active_profile_id
         position = button.position
         data_config = button.data_config or {}
 
@@ -318,25 +487,26 @@ class StreamDeckService:
             button_state_service.toggle_timer(profile_id, position, current_page, config)
 
         # Update the button display immediately
-        label = data_fetcher.fetch(
-            button.data_source,
-            button.data_format,
-            button.data_config,
-            profile_id=profile_id,
-            position=position,
-            page=current_page
-        )
+        started = time.perf_counter()
+        label = self._fetch_label(button, profile_id, current_page)
 
-        image = image_renderer.render_key_image(
+        image = self.renderer.render_frame(
+            serial,
             deck,
             icon_path=button.icon_path,
             label=label,
             background_color=button.background_color,
-            icon_color=button.icon_color
+            icon_color=button.icon_color,
+            font_size=button.font_size or 14,
+            font_family=button.font_family
         )
+        key_render_seconds.observe(time.perf_counter() - started, device=serial, data_source=button.data_source)
 
-        with deck:
-            deck.set_key_image(position, image)
+        if event:
+            event.mark_rendered()
+            self._write_key_image(serial, position, image, on_written=event.mark_written)
+        else:
+            self._write_key_image(serial, position, image)
 
         # Notify via WebSocket
         if self._loop:
@@ -351,21 +521,13 @@ class StreamDeckService:
                 self._loop
             )
 
-    def _get_max_page(self, db: Session, profile_id: str) -> int:
-        """Get the maximum page number for a profile."""
-        from sqlalchemy import func
-        result = db.query(func.max(Button.page)).filter(
-            Button.profile_id == profile_id
-        ).scalar()
-        return result if result is not None else 0
-
-    def _navigate_page(self, serial: str, device: Device, db: Session, direction: int):
+    def _navigate_page(self, serial: str, direction: int, event: Optional[KeyEvent] = None):
         """Navigate to next or previous page."""
         state = self.device_states.get(serial)
         if not state:
             return
 
-        max_page = self._get_max_page(db, device.active_profile_id)
+        max_page = device_registry.get_max_page(device_registry.get_active_profile_id(serial))
         new_page = state.current_page + direction
 
         # Wrap around or clamp
@@ -377,19 +539,19 @@ class StreamDeckService:
         state.current_page = new_page
         deck = self.connected_decks.get(serial)
         if deck:
-            self._apply_profile(db, device, deck, new_page)
+            self._apply_profile(serial, deck, new_page, event)
 
         # Notify via WebSocket
         if self._loop:
             asyncio.run_coroutine_threadsafe(
                 websocket_manager.send_state_changed("page_changed", {
-                    "device_id": device.id,
+                    "device_id": device_registry.get_device_id(serial),
                     "page": new_page
                 }),
                 self._loop
             )
 
-    def _go_to_page(self, serial: str, device: Device, db: Session, page: int):
+    def _go_to_page(self, serial: str, page: int, event: Optional[KeyEvent] = None):
         """Go to a specific page."""
         state = self.device_states.get(serial)
         if not state:
@@ -398,45 +560,45 @@ class StreamDeckService:
         state.current_page = page
         deck = self.connected_decks.get(serial)
         if deck:
-            self._apply_profile(db, device, deck, page)
+            self._apply_profile(serial, deck, page, event)
 
         if self._loop:
             asyncio.run_coroutine_threadsafe(
                 websocket_manager.send_state_changed("page_changed", {
-                    "device_id": device.id,
+                    "device_id": device_registry.get_device_id(serial),
                     "page": page
                 }),
                 self._loop
             )
 
-    def _open_folder(self, serial: str, device: Device, db: Session, folder_profile_id: str):
+    def _open_folder(self, serial: str, folder_profile_id: str, event: Optional[KeyEvent] = None):
         """Open a folder (switch to another profile with back navigation)."""
         state = self.device_states.get(serial)
         if not state:
             return
 
         # Push current profile and page to stack
-        state.folder_stack.append((device.active_profile_id, state.current_page))
+        state.folder_stack.append((device_registry.get_active_profile_id(serial), state.current_page))
 
         # Switch to folder profile
-        device.active_profile_id = folder_profile_id
+        device_registry.set_active_profile(serial, folder_profile_id)
+        self._persist_active_profile(serial, folder_profile_id)
         state.current_page = 0
-        db.commit()
 
         deck = self.connected_decks.get(serial)
         if deck:
-            self._apply_profile(db, device, deck, 0)
+            self._apply_profile(serial, deck, 0, event)
 
         if self._loop:
             asyncio.run_coroutine_threadsafe(
                 websocket_manager.send_state_changed("folder_opened", {
-                    "device_id": device.id,
+                    "device_id": device_registry.get_device_id(serial),
                     "profile_id": folder_profile_id
                 }),
                 self._loop
             )
 
-    def _go_back(self, serial: str, device: Device, db: Session):
+    def _go_back(self, serial: str, event: Optional[KeyEvent] = None):
         """Go back to the previous folder/profile."""
         state = self.device_states.get(serial)
         if not state or not state.folder_stack:
@@ -446,34 +608,49 @@ class StreamDeckService:
         prev_profile_id, prev_page = state.folder_stack.pop()
 
         # Switch back
-        device.active_profile_id = prev_profile_id
+        device_registry.set_active_profile(serial, prev_profile_id)
+        self._persist_active_profile(serial, prev_profile_id)
         state.current_page = prev_page
-        db.commit()
 
         deck = self.connected_decks.get(serial)
         if deck:
-            self._apply_profile(db, device, deck, prev_page)
+            self._apply_profile(serial, deck, prev_page, event)
 
         if self._loop:
             asyncio.run_coroutine_threadsafe(
                 websocket_manager.send_state_changed("folder_closed", {
-                    "device_id": device.id,
+                    "device_id": device_registry.get_device_id(serial),
                     "profile_id": prev_profile_id,
                     "page": prev_page
                 }),
                 self._loop
             )
 
-    def _apply_profile(self, db: Session, device: Device, deck, page: int = None):
-        """Apply a profile to a device, optionally filtering by page."""
-        serial = device.serial_number
-        state = self.device_states.get(serial)
+    def _persist_active_profile(self, serial: str, profile_id: str):
+        """Store a device's active profile in the database off the key press path."""
+        if not self._db_session_factory:
+            return
 
-        # Cancel any existing data refresh timers
-        if state:
-            for timer in state.data_refresh_timers.values():
-                timer.cancel()
-            state.data_refresh_timers.clear()
+        def persist():
+            db = self._db_session_factory()
+            try:
+                device = db.query(Device).filter(Device.serial_number == serial).first()
+                if device and device.active_profile_id != profile_id:
+                    device.active_profile_id = profile_id
+                    db.commit()
+            finally:
+                db.close()
+
+        scheduler.schedule(0, persist, kind="persist", serial=serial)
+
+    def _apply_profile(self, serial: str, deck, page: int = None, event: Optional[KeyEvent] = None):
+        """Apply the device's active profile, optionally switching to a page.
+
+        When the switch was caused by a key press, its event is marked once
+        the page is rendered and once it is on the device.
+        """
+        state = self.device_states.get(serial)
+        self._stop_page_updates(serial)
 
         # Use provided page, or current page from state, or default to 0
         if page is not None:
@@ -485,45 +662,230 @@ class StreamDeckService:
         else:
             current_page = 0
 
-        # Get buttons for the current page
-        buttons = db.query(Button).filter(
-            Button.profile_id == device.active_profile_id,
-            Button.page == current_page
-        ).all()
+        profile_id = device_registry.get_active_profile_id(serial)
+        started = time.perf_counter()
 
-        button_map = {b.position: b for b in buttons}
+        button_map = device_registry.get_page(profile_id, current_page)
+        prerendered = state.prerendered.get((profile_id, current_page)) if state else None
+        generation = state.prerender_generation if state else 0
 
+        # Render every key that is not prerendered concurrently
+        images = {}
+        futures = {}
         for key in range(deck.key_count()):
             button = button_map.get(key)
-            if button:
-                # Get label - either from data source or static label
-                label = button.label
-                if button.data_source:
-                    label = data_fetcher.fetch(
-                        button.data_source,
-                        button.data_format,
-                        button.data_config,
-                        profile_id=device.active_profile_id,
-                        position=button.position,
-                        page=current_page
-                    )
-                    # Set up refresh timer for this button
-                    self._setup_data_refresh(serial, device, button, deck, current_page)
-
-                image = image_renderer.render_key_image(
-                    deck,
-                    icon_path=button.icon_path,
-                    label=label,
-                    background_color=button.background_color,
-                    icon_color=button.icon_color
+            if prerendered and key in prerendered:
+                images[key] = prerendered[key]
+            elif button:
+                futures[key] = self._render_pool.submit(
+                    self._render_button, serial, deck, button, profile_id, current_page
                 )
             else:
-                image = image_renderer.render_blank_key(deck)
+                futures[key] = self._render_pool.submit(self.renderer.render_blank, deck)
 
-            with deck:
-                deck.set_key_image(key, image)
+            if button and button.data_source:
+                # Schedule periodic refresh for this button
+                self._setup_data_refresh(serial, profile_id, button, deck, current_page)
+
+        for key, future in futures.items():
+            try:
+                images[key] = future.result()
+            except Exception as e:
+                logger.error(f"Error rendering key {key} on {serial}: {e}")
+
+        if event:
+            event.mark_rendered()
+
+        if state and prerendered is None and state.prerender_generation == generation:
+            # Keep this page around so navigating back to it is instant
+            state.prerendered[(profile_id, current_page)] = {
+                key: image for key, image in images.items()
+                if not (button_map.get(key) and button_map[key].data_source)
+            }
 
-    def _setup_data_refresh(self, serial: str, device: Device, button: Button, deck, current_page: int):
+        def on_written():
+            elapsed = time.perf_counter() - started
+            elapsed_ms = elapsed * 1000
+            page_switch_seconds.observe(elapsed, device=serial)
+            if state:
+                state.page_switch_ms.append(elapsed_ms)
+            if event:
+                event.mark_written()
+            logger.debug(f"Page {current_page} on {serial} applied in {elapsed_ms:.1f} ms")
+
+        # Push the whole page in a single burst
+        writer = self.key_writers.get(serial)
+        if writer:
+            writer.submit_many(images, on_written=on_written)
+
+        # Animated keys start from the still image just written
+        for button in button_map.values():
+            if animation_engine.animates(button):
+                self._background_pool.submit(self._animate_button, serial, deck, button, profile_id, current_page)
+
+        # Get the pages reachable from here ready in the background
+        if state and self._running:
+            self._background_pool.submit(self._prerender_targets, serial, deck, profile_id, current_page)
+
+    def _prerender_targets(self, serial: str, deck, profile_id: str, page: int):
+        """Prerender the next and previous page, the folder we came from and
+        every page or folder the current page can open."""
+        state = self.device_states.get(serial)
+        if not state or not self._still_showing(serial, profile_id, page):
+            return
+
+        generation = state.prerender_generation
+        max_page = device_registry.get_max_page(profile_id)
+
+        targets = [
+            (profile_id, page),
+            (profile_id, page + 1 if page < max_page else 0),
+            (profile_id, page - 1 if page > 0 else max_page),
+        ]
+        if state.folder_stack:
+            targets.append(state.folder_stack[-1])
+
+        for button in device_registry.get_page(profile_id, page).values():
+            action = button.action
+            if not action:
+                continue
+            if action.action_type == "open_folder" and action.config.get("profile_id"):
+                targets.append((action.config["profile_id"], 0))
+            elif action.action_type == "go_to_page":
+                targets.append((profile_id, action.config.get("page", 0)))
+
+        rendered = {}
+        try:
+            for target in dict.fromkeys(targets):
+                if target in state.prerendered:
+                    continue
+                if not self._still_showing(serial, profile_id, page):
+                    # Pressed on already; a newer job prerenders from there
+                    return
+
+                target_profile_id, target_page = target
+                button_map = device_registry.get_page(target_profile_id, target_page)
+
+                # Data keys are rendered when shown so their value is current
+                frames = {}
+                for key in range(deck.key_count()):
+                    button = button_map.get(key)
+                    if not button:
+                        frames[key] = self.renderer.render_blank(deck)
+                    elif not button.data_source:
+                        frames[key] = self._render_button(serial, deck, button, target_profile_id, target_page)
+                rendered[target] = frames
+        except Exception as e:
+            logger.error(f"Error prerendering pages for {serial}: {e}")
+            return
+
+        # Drop results if buttons changed while we were rendering
+        if state.prerender_generation != generation:
+            return
+
+        prerendered = {t: frames for t, frames in state.prerendered.items() if t in targets}
+        prerendered.update(rendered)
+        state.prerendered = prerendered
+
+    def _still_showing(self, serial: str, profile_id: str, page: int) -> bool:
+        state = self.device_states.get(serial)
+        return (
+            self._running and state is not None and state.current_page == page
+            and device_registry.get_active_profile_id(serial) == profile_id
+        )
+
+    def invalidate_prerender(self, profile_id: Optional[str] = None):
+        """Discard prerendered pages, for one profile or all of them."""
+        for state in list(self.device_states.values()):
+            state.prerender_generation += 1
+            if profile_id is None:
+                state.prerendered = {}
+            else:
+                state.prerendered = {
+                    t: frames for t, frames in state.prerendered.items() if t[0] != profile_id
+                }
+
+    def _fetch_label(self, button: ButtonSnapshot, profile_id: str, page: int) -> str:
+        """Fetch the current value of a button's data source."""
+        started = time.perf_counter()
+        try:
+            return data_fetcher.fetch(
+                button.data_source,
+                button.data_format,
+                button.data_config,
+                profile_id=profile_id,
+                position=button.position,
+                page=page
+            )
+        finally:
+            data_fetch_seconds.observe(time.perf_counter() - started, data_source=button.data_source)
+
+    def _render_button(
+        self,
+        serial: str,
+        deck,
+        button: ButtonSnapshot,
+        profile_id: str,
+        page: int,
+        shared: bool = False
+    ) -> KeyImage:
+        """Render a configured button, fetching its label from its data source if it has one.
+
+        With shared, the image may come back as a SharedFrame, which must be
+        handed to the device's writer right away.
+        """
+        started = time.perf_counter()
+        label = button.label
+        if button.data_source:
+            label = self._fetch_label(button, profile_id, page)
+
+        render = partial(self.renderer.render_frame, serial) if shared else self.renderer.render_key
+        image = render(
+            deck,
+            icon_path=button.icon_path,
+            label=label,
+            background_color=button.background_color,
+            icon_color=button.icon_color,
+            font_size=button.font_size or 14,
+            font_family=button.font_family
+        )
+        key_render_seconds.observe(
+            time.perf_counter() - started,
+            device=serial,
+            data_source=button.data_source or "none"
+        )
+        return image
+
+    def _animate_button(self, serial: str, deck, button: ButtonSnapshot, profile_id: str, page: int):
+        """Start, update or stop the animation of a key on the current page."""
+        writer = self.key_writers.get(serial)
+        state = self.device_states.get(serial)
+        if not writer or not state:
+            return
+        if state.current_page != page or device_registry.get_active_profile_id(serial) != profile_id:
+            return  # Another page is shown by now
+
+        if not animation_engine.animates(button):
+            animation_engine.clear_key(serial, button.position)
+            return
+
+        try:
+            label = self._fetch_label(button, profile_id, page) if button.data_source else button.label
+            toggle_state = state.toggle_states.get((profile_id, page, button.position))
+            animation_engine.set_key(serial, deck, writer, button, label, toggle_state)
+        except Exception as e:
+            logger.error(f"Error animating key {button.position} on {serial}: {e}")
+
+    def _animate_press(self, serial: str, profile_id: str, page: int, button: ButtonSnapshot):
+        """Flip a toggle key's state and start the animations a press triggers."""
+        state = self.device_states.get(serial)
+        if state and button.is_toggle:
+            toggle_key = (profile_id, page, button.position)
+            state.toggle_states[toggle_key] = not state.toggle_states.get(toggle_key, False)
+            animation_engine.set_state(serial, button.position, state.toggle_states[toggle_key])
+        animation_engine.press(serial, button.position)
+
+    def _setup_data_refresh(self, serial: str, profile_id: str, button: ButtonSnapshot, deck, current_page: int):
         """Set up periodic refresh for a data display button."""
         state = self.device_states.get(serial)
         if not state or not self._running:
@@ -541,60 +903,78 @@ class StreamDeckService:
                 return
 
             try:
-                # Fetch new data
-                label = data_fetcher.fetch(
-                    button.data_source,
-                    button.data_format,
-                    button.data_config,
-                    profile_id=device.active_profile_id,
-                    position=button.position,
-                    page=current_page
-                )
-
-                # Render and update the button
-                image = image_renderer.render_key_image(
-                    deck,
-                    icon_path=button.icon_path,
-                    label=label,
-                    background_color=button.background_color,
-                    icon_color=button.icon_color
-                )
-
-                with deck:
-                    deck.set_key_image(button.position, image)
+                if animation_engine.is_animated(serial, button.position):
+                    # New frames with the new value, played from the same point in the cycle
+                    self._animate_button(serial, deck, button, profile_id, current_page)
+                    return
 
-                # Schedule next refresh
-                if self._running and serial in self.connected_decks:
-                    state = self.device_states.get(serial)
-                    if state and state.current_page == current_page:
-                        timer = threading.Timer(interval_sec, refresh_button)
-                        timer.daemon = True
-                        timer.start()
-                        state.data_refresh_timers[button.position] = timer
+                # Fetch new data, render and queue the update
+                image = self._render_button(serial, deck, button, profile_id, current_page, shared=True)
+                self._write_key_image(serial, button.position, image, urgent=False)
 
             except Exception as e:
                 logger.error(f"Error refreshing data button {button.position}: {e}")
 
-        # Schedule first refresh
-        timer = threading.Timer(interval_sec, refresh_button)
-        timer.daemon = True
-        timer.start()
-        state.data_refresh_timers[button.position] = timer
+        # Replace any refresh already scheduled for this key
+        old_job = state.data_refresh_jobs.pop(button.position, None)
+        if old_job:
+            scheduler.cancel(old_job)
+
+        state.data_refresh_jobs[button.position] = scheduler.schedule(
+            interval_sec,
+            refresh_button,
+            interval=interval_sec,
+            lane="data",
+            kind="data_refresh",
+            serial=serial,
+            page=current_page,
+            position=button.position
+        )
 
-    def _apply_default_layout(self, deck):
+    def _stop_page_updates(self, serial: str):
+        """Cancel the data refreshes and animations of the page on a device."""
+        scheduler.cancel_where(serial=serial, kind="data_refresh")
+        animation_engine.clear_device(serial)
+        state = self.device_states.get(serial)
+        if state:
+            state.data_refresh_jobs.clear()
+
+    def _apply_default_layout(self, serial: str, deck):
         """Apply a default layout to a newly connected device."""
+        self._stop_page_updates(serial)
+
+        images = {}
         for key in range(deck.key_count()):
-            image = image_renderer.render_key_image(
+            images[key] = self.renderer.render_key(
                 deck,
                 label=f"Key {key}"
             )
-            with deck:
-                deck.set_key_image(key, image)
+
+        writer = self.key_writers.get(serial)
+        if writer:
+            writer.submit_many(images)
+
+    def _write_key_image(
+        self,
+        serial: str,
+        key: int,
+        image: KeyImage,
+        urgent: bool = True,
+        on_written: Optional[Callable[[], None]] = None
+    ):
+        """Queue a key image on the device's writer."""
+        writer = self.key_writers.get(serial)
+        if writer:
+            writer.submit(key, image, urgent=urgent, on_written=on_written)
 
     def get_connected_devices(self) -> list:
         """Get list of connected device serial numbers."""
         return list(self.connected_decks.keys())
 
+    def get_key_sizes(self) -> set:
+        """Key image sizes of the connected devices."""
+        return {tuple(deck.key_image_format()["size"]) for deck in list(self.connected_decks.values())}
+
     def is_device_connected(self, serial: str) -> bool:
         """Check if a device is connected."""
         return serial in self.connected_decks
@@ -608,7 +988,7 @@ class StreamDeckService:
             return True
         return False
 
-    def update_button(self, serial: str, position: int, button: Button):
+    def update_button(self, serial: str, position: int, button):
         """Update a single button on a device."""
         deck = self.connected_decks.get(serial)
         if not deck:
@@ -616,92 +996,55 @@ class StreamDeckService:
 
         state = self.device_states.get(serial)
 
-        # Cancel existing timer for this button if any
-        if state and position in state.data_refresh_timers:
-            state.data_refresh_timers[position].cancel()
-            del state.data_refresh_timers[position]
+        # Cancel existing refresh for this button if any
+        if state and position in state.data_refresh_jobs:
+            scheduler.cancel(state.data_refresh_jobs.pop(position))
 
-        # Get label - either from data source or static label
-        label = button.label
-        profile_id = None
+        profile_id = device_registry.get_active_profile_id(serial)
         current_page = state.current_page if state else 0
 
-        if self._db_session_factory:
-            db = self._db_session_factory()
-            try:
-                device = db.query(Device).filter(Device.serial_number == serial).first()
-                if device:
-                    profile_id = device.active_profile_id
-            finally:
-                db.close()
-
-        if button.data_source:
-            label = data_fetcher.fetch(
-                button.data_source,
-                button.data_format,
-                button.data_config,
-                profile_id=profile_id,
-                position=button.position,
-                page=current_page
-            )
-            # Set up refresh timer if we have a device record
-            if self._db_session_factory and state and profile_id:
-                db = self._db_session_factory()
-                try:
-                    device = db.query(Device).filter(Device.serial_number == serial).first()
-                    if device:
-                        self._setup_data_refresh(serial, device, button, deck, current_page)
-                finally:
-                    db.close()
-
-        image = image_renderer.render_key_image(
-            deck,
-            icon_path=button.icon_path,
-            label=label,
-            background_color=button.background_color,
-            icon_color=button.icon_color
-        )
+        if button.data_source and state and profile_id:
+            self._setup_data_refresh(serial, profile_id, button, deck, current_page)
 
-        with deck:
-            deck.set_key_image(position, image)
+        image = self._render_button(serial, deck, button, profile_id, current_page)
+        self._write_key_image(serial, position, image)
+        self._animate_button(serial, deck, button, profile_id, current_page)
         return True
 
-    def refresh_device(self, serial: str, db: Session, page: int = None):
-        """Refresh the device display from database."""
+    def refresh_device(self, serial: str, page: int = None):
+        """Refresh the device display from the registry."""
         deck = self.connected_decks.get(serial)
         if not deck:
             return False
 
-        device = db.query(Device).filter(Device.serial_number == serial).first()
-        if device and device.active_profile_id:
-            self._apply_profile(db, device, deck, page)
+        if device_registry.get_active_profile_id(serial):
+            self._apply_profile(serial, deck, page)
         else:
-            self._apply_default_layout(deck)
+            self._apply_default_layout(serial, deck)
         return True
 
     def get_device_state(self, serial: str) -> Optional[dict]:
         """Get the current state of a device."""
         state = self.device_states.get(serial)
         if state:
+            switch_times = list(state.page_switch_ms)
             return {
                 "current_page": state.current_page,
-                "folder_depth": len(state.folder_stack)
+                "folder_depth": len(state.folder_stack),
+                "last_page_switch_ms": round(switch_times[-1], 1) if switch_times else None,
+                "avg_page_switch_ms": round(sum(switch_times) / len(switch_times), 1) if switch_times else None
             }
         return None
 
-    def set_page(self, serial: str, page: int, db: Session) -> bool:
+    def set_page(self, serial: str, page: int) -> bool:
         """Set the current page for a device."""
         state = self.device_states.get(serial)
         deck = self.connected_decks.get(serial)
         if not state or not deck:
             return False
 
-        device = db.query(Device).filter(Device.serial_number == serial).first()
-        if not device:
-            return False
-
         state.current_page = page
-        self._apply_profile(db, device, deck, page)
+        self._apply_profile(serial, deck, page)
         return True
 
     def identify_device(self, serial: str) -> bool:
@@ -710,18 +1053,22 @@ class StreamDeckService:
         if not deck:
             return False
 
-        def flash():
-            for _ in range(3):
-                with deck:
-                    deck.set_brightness(100)
-                threading.Event().wait(0.3)
+        def set_brightness(percent: int):
+            try:
                 with deck:
-                    deck.set_brightness(0)
-                threading.Event().wait(0.3)
-            with deck:
-                deck.set_brightness(50)
-
-        threading.Thread(target=flash, daemon=True).start()
+                    deck.set_brightness(percent)
+            except Exception as e:
+                logger.debug(f"Error flashing device {serial}: {e}")
+
+        # Three on/off flashes 0.3 s apart, then back to normal brightness
+        steps = [100, 0] * 3 + [50]
+        for i, percent in enumerate(steps):
+            scheduler.schedule(
+                i * 0.3,
+                lambda percent=percent: set_brightness(percent),
+                kind="identify",
+                serial=serial
+            )
         return True
 
 
@@ -0,0 +1,240 @@
+"""Virtual Stream Deck devices for running and benchmarking without hardware."""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from .hotplug import ManualEventSource
+
+logger = logging.getLogger(__name__)
+
+# Key layout and image format of the real models, as reported by the StreamDeck library
+MODELS = {
+    "mini": {
+        "deck_type": "Stream Deck Mini",
+        "key_layout": (2, 3),
+        "image_format": {"size": (80, 80), "format": "BMP", "flip": (False, True), "rotation": 90},
+    },
+    "original": {
+        "deck_type": "Stream Deck Original",
+        "key_layout": (3, 5),
+        "image_format": {"size": (72, 72), "format": "BMP", "flip": (True, True), "rotation": 0},
+    },
+    "mk2": {
+        "deck_type": "Stream Deck MK.2",
+        "key_layout": (3, 5),
+        "image_format": {"size": (72, 72), "format": "JPEG", "flip": (True, True), "rotation": 0},
+    },
+    "xl": {
+        "deck_type": "Stream Deck XL",
+        "key_layout": (4, 8),
+        "image_format": {"size": (96, 96), "format": "JPEG", "flip": (True, True), "rotation": 0},
+    },
+    "neo": {
+        "deck_type": "Stream Deck Neo",
+        "key_layout": (2, 4),
+        "image_format": {"size": (96, 96), "format": "JPEG", "flip": (True, True), "rotation": 0},
+    },
+    "plus": {
+        "deck_type": "Stream Deck +",
+        "key_layout": (2, 4),
+        "image_format": {"size": (120, 120), "format": "JPEG", "flip": (False, False), "rotation": 0},
+    },
+}
+
+
+class VirtualWrite:
+    """One key image written to a virtual deck."""
+    def __init__(self, key: int, image: bytes, written_at: float):
+        self.key = key
+        self.image = image
+        self.written_at = written_at  # time.perf_counter() when the write finished
+
+
+class VirtualStreamDeck:
+    """In-memory stand-in for a StreamDeck device object.
+
+    Implements the part of the StreamDeck device API the service uses. Every
+    key image written is recorded, each write can be delayed to simulate USB
+    transfer time, and key presses can be injected with press() and
+    release(), which call the key callback like the HID reader thread would.
+    """
+
+    def __init__(
+        self,
+        serial: str,
+        model: str = "mk2",
+        key_count: Optional[int] = None,
+        image_format: Optional[dict] = None,
+        write_latency: float = 0.0,
+        firmware_version: str = "virtual"
+    ):
+        if model not in MODELS:
+            raise ValueError(f"Unknown virtual deck model: {model}")
+        spec = MODELS[model]
+
+        self.serial = serial
+        self.model = model
+        self.write_latency = write_latency  # seconds per key image
+        self.firmware_version = firmware_version
+        self.brightness: Optional[int] = None
+        self.writes: List[VirtualWrite] = []
+        self.key_images: Dict[int, bytes] = {}  # key -> last image written
+
+        rows, cols = spec["key_layout"]
+        self._deck_type = spec["deck_type"]
+        self._key_count = key_count if key_count is not None else rows * cols
+        self._key_layout = (rows, cols) if key_count is None else (1, key_count)
+        self._image_format = dict(spec["image_format"], **(image_format or {}))
+        self._key_states = [False] * self._key_count
+        self._key_callback: Optional[Callable] = None
+        self._is_open = False
+        self._connected = True
+        self._io_lock = threading.RLock()
+        self._record_lock = threading.Lock()
+
+    def __enter__(self):
+        self._io_lock.acquire()
+
+    def __exit__(self, type, value, traceback):
+        self._io_lock.release()
+
+    # Device API
+
+    def open(self):
+        if not self._connected:
+            raise IOError(f"Virtual deck {self.serial} is disconnected")
+        self._is_open = True
+
+    def close(self):
+        self._is_open = False
+
+    def is_open(self) -> bool:
+        return self._is_open
+
+    def connected(self) -> bool:
+        return self._connected
+
+    def id(self) -> str:
+        return f"virtual://{self.serial}"
+
+    def key_count(self) -> int:
+        return self._key_count
+
+    def deck_type(self) -> str:
+        return self._deck_type
+
+    def is_visual(self) -> bool:
+        return True
+
+    def key_layout(self) -> Tuple[int, int]:
+        return self._key_layout
+
+    def key_image_format(self) -> dict:
+        return dict(self._image_format)
+
+    def key_states(self) -> List[bool]:
+        return list(self._key_states)
+
+    def get_serial_number(self) -> str:
+        return self.serial
+
+    def get_firmware_version(self) -> str:
+        return self.firmware_version
+
+    def set_key_callback(self, callback: Optional[Callable]):
+        self._key_callback = callback
+
+    def set_brightness(self, percent: int):
+        self.brightness = percent
+
+    def reset(self):
+        with self._record_lock:
+            self.key_images.clear()
+
+    def set_key_image(self, key: int, image: bytes):
+        if not self._is_open:
+            raise IOError(f"Virtual deck {self.serial} is not open")
+        if not 0 <= key < self._key_count:
+            raise IndexError(f"Invalid key index {key}")
+
+        if self.write_latency > 0:
+            time.sleep(self.write_latency)
+
+        # Copy like the USB transport does, the image may be a view of shared memory
+        image = bytes(image)
+        with self._record_lock:
+            self.writes.append(VirtualWrite(key, image, time.perf_counter()))
+            self.key_images[key] = image
+
+    # Test helpers
+
+    def press(self, key: int):
+        """Inject a key press."""
+        self._set_key_state(key, True)
+
+    def release(self, key: int):
+        """Inject a key release."""
+        self._set_key_state(key, False)
+
+    def tap(self, key: int):
+        """Inject a press followed by a release."""
+        self.press(key)
+        self.release(key)
+
+    def clear_writes(self):
+        """Forget recorded writes, keeping the current key images."""
+        with self._record_lock:
+            self.writes.clear()
+
+    def _set_key_state(self, key: int, state: bool):
+        if not 0 <= key < self._key_count:
+            raise IndexError(f"Invalid key index {key}")
+        self._key_states[key] = state
+        if self._key_callback and self._is_open:
+            self._key_callback(self, key, state)
+
+
+class VirtualDeviceManager:
+    """Drop-in replacement for StreamDeck's DeviceManager with virtual decks.
+
+    Adding or removing a deck triggers the manager's event source, so the
+    service picks up the change like a hotplug event.
+    """
+
+    def __init__(self, event_source: Optional[ManualEventSource] = None):
+        self.event_source = event_source or ManualEventSource()
+        self.decks: Dict[str, VirtualStreamDeck] = {}  # serial -> deck
+        self._lock = threading.Lock()
+
+    def enumerate(self) -> List[VirtualStreamDeck]:
+        with self._lock:
+            return list(self.decks.values())
+
+    def add(self, serial: Optional[str] = None, **kwargs) -> VirtualStreamDeck:
+        """Plug in a virtual deck. Keyword arguments go to VirtualStreamDeck."""
+        with self._lock:
+            if serial is None:
+                serial = f"VIRTUAL{len(self.decks) + 1:04d}"
+            deck = VirtualStreamDeck(serial, **kwargs)
+            self.decks[serial] = deck
+        self.event_source.trigger()
+        return deck
+
+    def remove(self, serial: str) -> Optional[VirtualStreamDeck]:
+        """Unplug a virtual deck."""
+        with self._lock:
+            deck = self.decks.pop(serial, None)
+        if deck:
+            deck._connected = False
+            self.event_source.trigger()
+        return deck
+
+
+def create_virtual_device_manager(count: int, model: str = "mk2", write_latency: float = 0.0) -> VirtualDeviceManager:
+    """Create a manager with a number of identical virtual decks already plugged in."""
+    manager = VirtualDeviceManager()
+    for i in range(count):
+        manager.add(f"VIRTUAL{i + 1:04d}", model=model, write_latency=write_latency)
+    logger.info(f"Using {count} virtual {model} deck(s)")
+    return manager
@@ -1,3 +1,5 @@
 from .image import ImageRenderer
+from .cache import LRUCache
+from .glyphs import GlyphAtlas
 
-__all__ = ["ImageRenderer"]
+__all__ = ["ImageRenderer", "LRUCache", "GlyphAtlas"]
@@ -0,0 +1,185 @@
+"""Shared-memory rings of key image slots, one per device.
+
+Render workers write finished key images straight into a slot of the
+device's ring and return only a small descriptor (slot, sequence number,
+length). The device's key writer then sends the image to the deck from the
+shared memory, so the image bytes never travel over the worker pipe.
+"""
+import itertools
+import os
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import List, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Slot header: sequence number of the frame in the slot, and its length
+_HEADER = struct.Struct("<QI")
+
+_ring_ids = itertools.count(1)
+
+
+class FrameRing:
+    """Fixed-size slots of shared memory for one device's key images.
+
+    Slots are handed out and taken back in this process only: a slot is
+    acquired before a render job is sent, and released by the key writer
+    once the frame is on the device or has been replaced by a newer one.
+    A frame therefore cannot be overwritten while it is waiting or being
+    written.
+    """
+
+    def __init__(self, serial: str, slots: int, slot_size: int):
+        self.serial = serial
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = _HEADER.size + slot_size
+        self._shm = shared_memory.SharedMemory(
+            name=f"sdhub-{os.getpid()}-{next(_ring_ids)}",
+            create=True,
+            size=slots * self.stride
+        )
+        self.name = self._shm.name
+        self._free: List[int] = list(range(slots))
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Counters
+        self.frames = 0
+        self.exhausted = 0
+
+    def acquire(self) -> Optional[tuple]:
+        """Take a free slot for a new frame, as (slot, seq), or None if all slots are in use."""
+        with self._lock:
+            if self._closed or not self._free:
+                self.exhausted += 1
+                return None
+            return self._free.pop(), next(self._seq)
+
+    def release(self, slot: int):
+        """Give a slot back once its frame is no longer needed."""
+        with self._lock:
+            if not self._closed:
+                self._free.append(slot)
+
+    def frame(self, slot: int, seq: int, length: int) -> "SharedFrame":
+        """Descriptor of a frame a worker has written into a slot."""
+        self.frames += 1
+        return SharedFrame(self, slot, seq, length)
+
+    def view(self, slot: int, seq: int, length: int) -> Optional[memoryview]:
+        """The frame's bytes, or None if the slot no longer holds that frame."""
+        if self._closed:
+            return None
+        offset = slot * self.stride
+        slot_seq, slot_length = _HEADER.unpack_from(self._shm.buf, offset)
+        if slot_seq != seq or slot_length != length:
+            return None
+        start = offset + _HEADER.size
+        return self._shm.buf[start:start + length]
+
+    def free_count(self) -> int:
+        with self._lock:
+            return len(self._free)
+
+    def close(self):
+        """Unmap and remove the shared memory."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._shm.close()
+        except BufferError:
+            # A frame is still being written, the mapping goes away with it
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "free": self.free_count(),
+            "frames": self.frames,
+            "exhausted": self.exhausted,
+        }
+
+
+class SharedFrame:
+    """A key image held in a slot of a FrameRing."""
+    __slots__ = ("ring", "slot", "seq", "length", "_released")
+
+    def __init__(self, ring: FrameRing, slot: int, seq: int, length: int):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.length = length
+        self._released = False
+
+    def view(self) -> Optional[memoryview]:
+        return self.ring.view(self.slot, self.seq, self.length)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.ring.release(self.slot)
+
+    def __len__(self) -> int:
+        return self.length
+
+
+KeyImage = Union[bytes, SharedFrame]
+
+
+def frame_bytes(image: KeyImage) -> Optional[Union[bytes, memoryview]]:
+    """The data of a key image, without copying a shared frame."""
+    if isinstance(image, SharedFrame):
+        return image.view()
+    return image
+
+
+def release_frame(image: KeyImage):
+    """Release the slot of a shared frame; plain bytes need nothing."""
+    if isinstance(image, SharedFrame):
+        image.release()
+
+
+# Worker side: rings attached by name, kept open for the next frames
+_attached: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+_MAX_ATTACHED = 16
+
+
+def write_slot(name: str, stride: int, slot: int, seq: int, data: bytes) -> bool:
+    """Write a frame into a ring slot from a worker process.
+
+    Returns False if the frame does not fit or the ring is gone, in which
+    case the caller sends the bytes back instead.
+    """
+    if len(data) > stride - _HEADER.size:
+        return False
+
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return False
+        _attached[name] = shm
+        while len(_attached) > _MAX_ATTACHED:
+            _attached.popitem(last=False)[1].close()
+    else:
+        _attached.move_to_end(name)
+
+    offset = slot * stride
+    start = offset + _HEADER.size
+    shm.buf[start:start + len(data)] = data
+    # Header last, so a reader never sees a new sequence number with old data
+    _HEADER.pack_into(shm.buf, offset, seq, len(data))
+    return True
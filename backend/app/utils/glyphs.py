@@ -0,0 +1,62 @@
+"""Pre-rasterized glyphs for drawing numeric labels without text layout."""
+import math
+from typing import Dict, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+# Characters of clock, timer, counter and system stat labels
+ATLAS_CHARACTERS = "0123456789 :.,%+-/°CFGBAPMN"
+
+
+class GlyphAtlas:
+    """Masks of a font's digits and symbols, rasterized once per font and size.
+
+    Labels are laid out by advance width only, without shaping. Glyphs are
+    placed on the pixel grid the way Pillow's basic layout does, so the
+    result matches ImageDraw.text with a font using the basic layout
+    engine, the default without libraqm. Labels with a pair of characters
+    the font kerns are left to ImageDraw.text.
+    """
+
+    def __init__(self, font: ImageFont.FreeTypeFont, characters: str = ATLAS_CHARACTERS):
+        self.ascent, self.descent = font.getmetrics()
+        self.glyphs: Dict[str, Tuple[Image.Image, Tuple[int, int], float]] = {}  # char -> (mask, offset, advance)
+
+        for char in characters:
+            left, top, right, bottom = font.getbbox(char, anchor="ls")
+            mask = None
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top), 0)
+                ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255, anchor="ls")
+            self.glyphs[char] = (mask, (left, top), font.getlength(char))
+
+        self.kerned_pairs = {
+            first + second
+            for first in characters
+            for second in characters
+            if font.getlength(first + second) != self.glyphs[first][2] + self.glyphs[second][2]
+        }
+
+    def supports(self, text: str) -> bool:
+        """Whether every character of the text is in the atlas and no pair is kerned."""
+        return (
+            all(char in self.glyphs for char in text)
+            and not any(text[i:i + 2] in self.kerned_pairs for i in range(len(text) - 1))
+        )
+
+    def draw(self, image: Image.Image, xy: Tuple[float, float], text: str, fill, anchor: str = "mm"):
+        """Draw text centered horizontally on xy.
+
+        The vertical anchor is "m" (middle) or "s" (baseline), as for
+        ImageDraw.text.
+        """
+        x, y = xy
+        x -= sum(self.glyphs[char][2] for char in text) / 2
+        if anchor[1] == "m":
+            y += (self.ascent - self.descent) / 2
+        y = math.ceil(y)
+
+        for char in text:
+            mask, (left, top), advance = self.glyphs[char]
+            if mask is not None:
+                image.paste(fill, (math.floor(x) + left, y + top), mask)
+            x += advance
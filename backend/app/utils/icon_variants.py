@@ -0,0 +1,117 @@
+"""Icons pre-scaled to each key size, kept in the variant cache.
+
+Variants of an icon are stored under settings.variant_cache_path, in a
+directory named after a hash of the icon's path, with one subdirectory per
+version of the file: the variant of version (mtime, size) of icon.png for
+96x96 keys with room for a label is <hash>/<mtime>-<size>/96x96_0-0-20-0.png.
+A variant is used only if the icon's current modification time and size
+match exactly, so an icon replaced by an older file is never shown stale.
+
+Variants are plain RGB PNGs of exactly what the renderer would compose, so
+loading one replaces decoding and downscaling a possibly large original.
+Icon directories themselves are never written to.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from typing import Iterable, Optional, Tuple
+from PIL import Image
+from StreamDeck.ImageHelpers import PILHelper
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Icon margins (top, right, bottom, left) without and with room for a label
+NO_MARGINS = [0, 0, 0, 0]
+LABEL_MARGINS = [0, 0, 20, 0]
+
+# Key sizes of all supported Stream Deck models
+KEY_SIZES = ((72, 72), (80, 80), (96, 96), (112, 112), (120, 120), (80, 120))
+
+
+class _KeySize:
+    """Stand-in for a deck with the given key size, for PILHelper."""
+    def __init__(self, size: Tuple[int, int]):
+        self._image_format = {"size": tuple(size), "format": "BMP", "flip": (False, False), "rotation": 0}
+
+    def key_image_format(self) -> dict:
+        return self._image_format
+
+
+def _icon_dir(path: str) -> str:
+    """Directory holding all variants of an icon."""
+    name = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+    return os.path.join(settings.variant_cache_path, name)
+
+
+def _version(path: str) -> Optional[str]:
+    """The icon file's current version, from its modification time and size."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def variant_path(path: str, version: str, size: Tuple[int, int], margins: list) -> str:
+    width, height = size
+    return os.path.join(_icon_dir(path), version, f"{width}x{height}_{'-'.join(map(str, margins))}.png")
+
+
+def load_variant(path: str, size: Tuple[int, int], margins: list) -> Optional[Image.Image]:
+    """Load the stored variant of the icon's current version, or None if there is none."""
+    version = _version(path)
+    if version is None:
+        return None
+    try:
+        with Image.open(variant_path(path, version, size, margins)) as image:
+            return image.convert("RGB")
+    except OSError:
+        return None
+
+
+def save_variant(path: str, size: Tuple[int, int], margins: list, image: Image.Image):
+    """Store a variant of the icon's current version, dropping those of older versions."""
+    version = _version(path)
+    if version is None:
+        return
+    variant = variant_path(path, version, size, margins)
+    try:
+        os.makedirs(os.path.dirname(variant), exist_ok=True)
+        # Write under a temporary name so readers never see half a file
+        temp_file = f"{variant}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(temp_file, "PNG")
+        os.replace(temp_file, variant)
+
+        icon_dir = _icon_dir(path)
+        for name in os.listdir(icon_dir):
+            if name != version:
+                shutil.rmtree(os.path.join(icon_dir, name), ignore_errors=True)
+    except OSError as e:
+        logger.debug(f"Could not store icon variant {variant}: {e}")
+
+
+def scale_icon(deck, path: str, margins: list) -> Image.Image:
+    """Scale an icon file onto a key, as RGB."""
+    with Image.open(path) as icon:
+        return PILHelper.create_scaled_key_image(deck, icon, margins=margins)
+
+
+def generate_variants(path: str, sizes: Iterable[Tuple[int, int]] = KEY_SIZES):
+    """Create the variants of an icon for the given key sizes, with and without a label."""
+    for size in sizes:
+        for margins in (NO_MARGINS, LABEL_MARGINS):
+            if load_variant(path, size, margins) is None:
+                try:
+                    save_variant(path, size, margins, scale_icon(_KeySize(size), path, margins))
+                except OSError as e:
+                    logger.warning(f"Could not scale icon {path}: {e}")
+                    return
+
+
+def remove_variants(path: str):
+    """Delete all variants of an icon."""
+    shutil.rmtree(_icon_dir(path), ignore_errors=True)
@@ -1,15 +1,43 @@
+import hashlib
 import os
-from PIL import Image, ImageDraw, ImageFont
+import threading
+from typing import List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont, ImageSequence
 from StreamDeck.ImageHelpers import PILHelper
 from ..config import settings
+from .cache import LRUCache
+from .glyphs import GlyphAtlas
+from .native import to_native_key_format
+from .svg import is_svg, rasterize_svg, svg_supported
+from .icon_variants import LABEL_MARGINS, NO_MARGINS, load_variant, save_variant, scale_icon
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads", "icons")
 
+# Frames of an animated icon played at most, longer animations are cut off
+MAX_ICON_FRAMES = 300
+
+
+def _image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
 
 class ImageRenderer:
     def __init__(self):
         self.default_font = os.path.join(settings.fonts_path, "Roboto-Regular.ttf")
         self.default_icon = os.path.join(settings.images_path, "Released.png")
+        # Decoded icons scaled to a key, keyed by (path, mtime, key size, margins)
+        self.icon_cache = LRUCache(settings.icon_cache_bytes, sizeof=_image_nbytes)
+        # Background and icon composed as RGB, keyed by their inputs and key size
+        self.base_cache = LRUCache(settings.base_layer_cache_bytes, sizeof=_image_nbytes)
+        # Final native key images keyed by a hash of all render inputs and the key format
+        self.key_cache = LRUCache(settings.render_cache_bytes)
+        # Scaled icons stored on disk for the next start, see icon_variants
+        self.use_icon_variants = True
+        # Parsed fonts keyed by (font family, size); there are only a handful
+        self._fonts = {}
+        self._atlases = {}  # (font family, size) -> GlyphAtlas, None if the font has no glyph metrics
+        self._fonts_lock = threading.Lock()
+        self._animated_icons = {}  # (path, mtime) -> whether the icon has several frames
 
     def resolve_icon_path(self, icon_path: str) -> str:
         """Resolve API icon paths to filesystem paths."""
@@ -27,6 +55,169 @@ class ImageRenderer:
         # Already a filesystem path
         return icon_path
 
+    def _icon_mtime(self, resolved_path: str):
+        """Modification time of an icon file, or None if there is no such file
+        or it cannot be shown."""
+        if not resolved_path:
+            return None
+        if is_svg(resolved_path) and not svg_supported():
+            return None
+        try:
+            return os.stat(resolved_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scaled_icon(self, deck, resolved_path: str, mtime: int, margins: list) -> Image.Image:
+        """Get an icon scaled to the deck's key size.
+
+        Returns a copy the caller may draw on.
+        """
+        key = (resolved_path, mtime, deck.key_image_format()["size"], tuple(margins))
+        image = self.icon_cache.get(key)
+        if image is None:
+            if is_svg(resolved_path):
+                # Rasterized straight at the size it is shown at, so it is never rescaled
+                width, height = deck.key_image_format()["size"]
+                top, right, bottom, left = margins
+                icon = rasterize_svg(resolved_path, mtime, (width - left - right, height - top - bottom))
+                image = PILHelper.create_scaled_key_image(deck, icon, margins=margins)
+            else:
+                # Scaled once per key size and kept in the variant cache for the next start
+                size = deck.key_image_format()["size"]
+                image = load_variant(resolved_path, size, margins) if self.use_icon_variants else None
+                if image is None:
+                    image = scale_icon(deck, resolved_path, margins)
+                    if self.use_icon_variants:
+                        save_variant(resolved_path, size, margins, image)
+            self.icon_cache.put(key, image)
+        return image.copy()
+
+    def _base_layer(self, deck, resolved_path: str, icon_mtime: int, background_color: str, margins: list) -> Image.Image:
+        """Get the background with the scaled icon composed on top, as an RGB image.
+
+        The result is shared, callers must copy it before drawing on it.
+        """
+        key = (
+            deck.key_image_format()["size"], resolved_path, icon_mtime,
+            background_color, tuple(margins)
+        )
+        image = self.base_cache.get(key)
+        if image is not None:
+            return image
+
+        if icon_mtime is not None:
+            image = self._scaled_icon(deck, resolved_path, icon_mtime, margins)
+
+            # Apply background color if specified
+            if background_color:
+                bg = Image.new("RGBA", image.size, background_color)
+                image = Image.alpha_composite(bg, image.convert("RGBA"))
+        else:
+            # Create blank key image with background color
+            image = PILHelper.create_key_image(deck, background=background_color or "#000000")
+
+        # Convert to RGB (JPEG doesn't support alpha channel)
+        if image.mode == "RGBA":
+            rgb_image = Image.new("RGB", image.size, (0, 0, 0))
+            rgb_image.paste(image, mask=image.split()[3])
+            image = rgb_image
+
+        self.base_cache.put(key, image)
+        return image
+
+    def resolve_font_path(self, font_family: str = None) -> str:
+        """Resolve a font family to a font file.
+
+        A family is looked up in the fonts directory first ("Roboto-Bold" or
+        "Roboto-Bold.ttf"), otherwise it is passed on to FreeType, which also
+        searches the system font directories.
+        """
+        if not font_family:
+            return self.default_font
+
+        for name in (font_family, f"{font_family}.ttf", f"{font_family}.otf"):
+            path = os.path.join(settings.fonts_path, name)
+            if os.path.isfile(path):
+                return path
+        return font_family
+
+    def get_font(self, font_family: str = None, size: int = 14):
+        """Get a parsed font, loading each (family, size) only once."""
+        key = (font_family, size)
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+
+        with self._fonts_lock:
+            font = self._fonts.get(key)
+            if font is None:
+                font = self._load_font(font_family, size)
+                self._fonts[key] = font
+        return font
+
+    def get_glyph_atlas(self, font_family: str = None, size: int = 14):
+        """Get the glyph atlas of a font for fast numeric labels, if it has one.
+
+        The atlas reproduces Pillow's basic layout, so there is none when
+        labels are laid out with raqm, which places characters differently.
+        """
+        key = (font_family, size)
+        if key in self._atlases:
+            return self._atlases[key]
+
+        font = self.get_font(font_family, size)
+        with self._fonts_lock:
+            if key not in self._atlases:
+                basic_layout = (
+                    isinstance(font, ImageFont.FreeTypeFont)
+                    and font.layout_engine == ImageFont.Layout.BASIC
+                )
+                self._atlases[key] = GlyphAtlas(font) if basic_layout else None
+            return self._atlases[key]
+
+    def _load_font(self, font_family: str, size: int):
+        for path in (self.resolve_font_path(font_family), self.default_font):
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                continue
+        return ImageFont.load_default()
+
+    def _cache_key(self, deck, *inputs) -> bytes:
+        """Hash render inputs together with the deck's key image format.
+
+        Decks of the same model share entries, decks of other models never do.
+        """
+        image_format = deck.key_image_format()
+        fingerprint = repr((
+            image_format["size"],
+            image_format["format"],
+            tuple(image_format["flip"]),
+            image_format["rotation"],
+        ) + inputs)
+        return hashlib.blake2b(fingerprint.encode(), digest_size=16).digest()
+
+    def key_image_cache_key(
+        self,
+        deck,
+        icon_path: str = None,
+        label: str = None,
+        background_color: str = None,
+        icon_color: str = None,
+        font_size: int = 14,
+        font_family: str = None
+    ) -> bytes:
+        """Key of a finished key image in key_cache, taking the same arguments as render_key_image."""
+        resolved_path = self.resolve_icon_path(icon_path)
+        return self._cache_key(
+            deck, "key", resolved_path, self._icon_mtime(resolved_path), label,
+            background_color, icon_color, font_size, font_family
+        )
+
+    def blank_key_cache_key(self, deck, color: str = "#000000") -> bytes:
+        """Key of a blank key image in key_cache."""
+        return self._cache_key(deck, "blank", color)
+
     def render_key_image(
         self,
         deck,
@@ -34,66 +225,144 @@ class ImageRenderer:
         label: str = None,
         background_color: str = None,
         icon_color: str = None,
-        font_size: int = 14
+        font_size: int = 14,
+        font_family: str = None
     ):
         """Render a key image for the Stream Deck."""
-        # Resolve API paths to filesystem paths
-        resolved_path = self.resolve_icon_path(icon_path)
+        cache_key = self.key_image_cache_key(
+            deck, icon_path, label, background_color, icon_color, font_size, font_family
+        )
+        native = self.key_cache.get(cache_key)
+        if native is not None:
+            return native
 
-        # Check if we have a valid icon
-        has_icon = resolved_path and os.path.exists(resolved_path)
+        image = self.compose_key_image(
+            deck, icon_path, label, background_color, icon_color, font_size, font_family
+        )
+        native = to_native_key_format(deck, image)
+        self.key_cache.put(cache_key, native)
+        return native
 
-        if has_icon:
-            # Load and scale the icon
-            icon = Image.open(resolved_path)
-            margins = [0, 0, 20, 0] if label else [0, 0, 0, 0]
-            image = PILHelper.create_scaled_key_image(deck, icon, margins=margins)
-        else:
-            # Create blank key image with background color
-            bg_color = background_color if background_color else "#000000"
-            image = PILHelper.create_key_image(deck, background=bg_color)
+    def compose_key_image(
+        self,
+        deck,
+        icon_path: str = None,
+        label: str = None,
+        background_color: str = None,
+        icon_color: str = None,
+        font_size: int = 14,
+        font_family: str = None
+    ) -> Image.Image:
+        """Compose a key image as RGB, before conversion to the deck's native format.
 
-        # Apply background color if specified (only needed when we have an icon)
-        if background_color and has_icon:
-            bg = Image.new("RGBA", image.size, background_color)
-            image = Image.alpha_composite(bg.convert("RGBA"), image.convert("RGBA"))
+        The returned image may be shared with the base layer cache and must
+        not be modified.
+        """
+        # Resolve API paths to filesystem paths
+        resolved_path = self.resolve_icon_path(icon_path)
+        icon_mtime = self._icon_mtime(resolved_path)
+
+        # Background and icon only change when the button is edited, so only
+        # the label is drawn per render
+        margins = LABEL_MARGINS if label else NO_MARGINS
+        image = self._base_layer(deck, resolved_path, icon_mtime, background_color, margins)
 
         # Draw label if specified
         if label:
-            draw = ImageDraw.Draw(image)
-            try:
-                font = ImageFont.truetype(self.default_font, font_size)
-            except OSError:
-                font = ImageFont.load_default()
+            image = image.copy()
+            self._draw_label(image, label, icon_mtime is not None, icon_color, font_size, font_family)
 
-            text_color = icon_color if icon_color else "white"
+        return image
 
-            # Center text vertically if no icon, otherwise place at bottom
-            if has_icon:
-                text_y = image.height - 5
-                anchor = "ms"  # middle-bottom
-            else:
-                text_y = image.height / 2
-                anchor = "mm"  # middle-middle
+    def _draw_label(self, image: Image.Image, label: str, has_icon: bool, icon_color: str, font_size: int, font_family: str):
+        """Draw a label onto a key image, at the bottom below an icon, else centered."""
+        text_color = icon_color if icon_color else "white"
 
+        # Center text vertically if no icon, otherwise place at bottom
+        if has_icon:
+            text_y = image.height - 5
+            anchor = "ms"  # middle-bottom
+        else:
+            text_y = image.height / 2
+            anchor = "mm"  # middle-middle
+
+        # Numeric labels (clocks, timers, stats) are blitted from
+        # pre-rasterized glyphs, anything else goes through text layout
+        atlas = self.get_glyph_atlas(font_family, font_size)
+        if atlas and isinstance(label, str) and atlas.supports(label):
+            atlas.draw(image, (image.width / 2, text_y), label, text_color, anchor)
+        else:
+            draw = ImageDraw.Draw(image)
             draw.text(
                 (image.width / 2, text_y),
                 text=label,
-                font=font,
+                font=self.get_font(font_family, font_size),
                 anchor=anchor,
                 fill=text_color
             )
 
-        # Convert to RGB (JPEG doesn't support alpha channel)
-        if image.mode == "RGBA":
-            rgb_image = Image.new("RGB", image.size, (0, 0, 0))
-            rgb_image.paste(image, mask=image.split()[3])
-            image = rgb_image
+    def is_animated_icon(self, icon_path: str) -> bool:
+        """Whether an icon is an animated GIF, PNG or WebP."""
+        resolved_path = self.resolve_icon_path(icon_path)
+        mtime = self._icon_mtime(resolved_path)
+        if mtime is None:
+            return False
+
+        key = (resolved_path, mtime)
+        animated = self._animated_icons.get(key)
+        if animated is None:
+            try:
+                with Image.open(resolved_path) as icon:
+                    animated = getattr(icon, "is_animated", False)
+            except OSError:
+                animated = False
+            self._animated_icons[key] = animated
+        return animated
+
+    def compose_animated_key_images(
+        self,
+        deck,
+        icon_path: str = None,
+        label: str = None,
+        background_color: str = None,
+        icon_color: str = None,
+        font_size: int = 14,
+        font_family: str = None
+    ) -> Optional[List[Tuple[Image.Image, float]]]:
+        """Compose a key image for every frame of an animated icon.
 
-        return PILHelper.to_native_key_format(deck, image)
+        Returns (RGB image, seconds shown) per frame, or None if the icon is
+        not animated.
+        """
+        if not self.is_animated_icon(icon_path):
+            return None
+
+        resolved_path = self.resolve_icon_path(icon_path)
+        margins = LABEL_MARGINS if label else NO_MARGINS
+        images = []
+        with Image.open(resolved_path) as icon:
+            for index, frame in enumerate(ImageSequence.Iterator(icon)):
+                if index >= MAX_ICON_FRAMES:
+                    break
+                # Very short delays mean "as fast as possible", browsers show them for 100 ms
+                duration = frame.info.get("duration") or 0
+                duration = duration / 1000 if duration > 10 else 0.1
+
+                image = PILHelper.create_scaled_key_image(deck, frame.convert("RGBA"), margins=margins)
+                background = Image.new("RGBA", image.size, background_color or "#000000")
+                image = Image.alpha_composite(background, image.convert("RGBA")).convert("RGB")
+                if label:
+                    self._draw_label(image, label, True, icon_color, font_size, font_family)
+                images.append((image, duration))
+        return images
 
     def render_blank_key(self, deck, color: str = "#000000"):
         """Render a blank key with optional color."""
+        cache_key = self.blank_key_cache_key(deck, color)
+        native = self.key_cache.get(cache_key)
+        if native is not None:
+            return native
+
         image = PILHelper.create_key_image(deck)
         if color != "#000000":
             draw = ImageDraw.Draw(image)
@@ -105,7 +374,28 @@ class ImageRenderer:
             rgb_image.paste(image, mask=image.split()[3])
             image = rgb_image
 
-        return PILHelper.to_native_key_format(deck, image)
+        native = to_native_key_format(deck, image)
+        self.key_cache.put(cache_key, native)
+        return native
+
+    def cache_stats(self) -> dict:
+        """Statistics of the render caches."""
+        return {
+            "keys": self.key_cache.stats(),
+            "base_layers": self.base_cache.stats(),
+            "icons": self.icon_cache.stats(),
+            "fonts": {"entries": len(self._fonts), "glyph_atlases": len(self._atlases)},
+        }
+
+    def clear_caches(self):
+        """Drop all cached key images, icons and fonts."""
+        self.key_cache.clear()
+        self.base_cache.clear()
+        self.icon_cache.clear()
+        self._animated_icons = {}
+        with self._fonts_lock:
+            self._fonts = {}
+            self._atlases = {}
 
 
 image_renderer = ImageRenderer()
@@ -0,0 +1,99 @@
+"""Fast conversion of key images to the deck's native format."""
+import io
+import threading
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from StreamDeck.ImageHelpers import PILHelper
+
+Transpose = Image.Transpose
+
+# The eight orientations of a square key, as a single transpose (None = unchanged)
+_ORIENTATIONS = (
+    None,
+    Transpose.FLIP_LEFT_RIGHT,
+    Transpose.FLIP_TOP_BOTTOM,
+    Transpose.ROTATE_90,
+    Transpose.ROTATE_180,
+    Transpose.ROTATE_270,
+    Transpose.TRANSPOSE,
+    Transpose.TRANSVERSE,
+)
+
+_plans: Dict[tuple, Optional[Transpose]] = {}  # (rotation, flip, bottom up) -> transpose
+_bmp_headers: Dict[Tuple[int, int], bytes] = {}
+_lock = threading.Lock()
+
+
+def _orientation(rotation: int, flip: tuple, bottom_up: bool) -> Optional[Transpose]:
+    """Find the single transpose equal to rotating, then flipping the image.
+
+    Worked out once per format on a small probe image, so converting a key
+    is one pass over its pixels instead of up to three.
+    """
+    key = (rotation, tuple(flip), bottom_up)
+    if key in _plans:
+        return _plans[key]
+
+    probe = Image.frombytes("L", (2, 3), bytes(range(6)))
+    expected = probe
+    if rotation:
+        expected = expected.rotate(rotation, expand=True)
+    if flip[0]:
+        expected = expected.transpose(Transpose.FLIP_LEFT_RIGHT)
+    if flip[1]:
+        expected = expected.transpose(Transpose.FLIP_TOP_BOTTOM)
+    if bottom_up:
+        expected = expected.transpose(Transpose.FLIP_TOP_BOTTOM)
+
+    for method in _ORIENTATIONS:
+        candidate = probe if method is None else probe.transpose(method)
+        if candidate.size == expected.size and candidate.tobytes() == expected.tobytes():
+            with _lock:
+                _plans[key] = method
+            return method
+    raise ValueError(f"Unsupported key orientation: rotation {rotation}, flip {flip}")
+
+
+def _bmp_header(width: int, height: int) -> bytes:
+    """File and info header of a 24 bit BMP, exactly as PIL writes it."""
+    header = _bmp_headers.get((width, height))
+    if header is None:
+        with io.BytesIO() as stream:
+            Image.new("RGB", (width, height)).save(stream, "BMP")
+            data = stream.getvalue()
+        header = data[:int.from_bytes(data[10:14], "little")]
+        with _lock:
+            _bmp_headers[(width, height)] = header
+    return header
+
+
+def to_native_key_format(deck, image: Image.Image) -> bytes:
+    """Rotate, flip and encode an RGB key image for the deck.
+
+    Same output as PILHelper.to_native_key_format, with rotation and flips
+    done as one transpose. BMP keys are packed straight from the pixels:
+    the bottom-up row order is folded into the transpose and the BGR byte
+    order into the raw packer, so the BMP encoder is never involved.
+    """
+    image_format = deck.key_image_format()
+    rotation = image_format["rotation"] or 0
+    if image.mode != "RGB" or image.size != tuple(image_format["size"]) or rotation % 90:
+        return PILHelper.to_native_key_format(deck, image)
+
+    width, height = image.size
+    is_bmp = image_format["format"] == "BMP"
+    # Rows of a BMP are padded to four bytes; key sizes never need it
+    bottom_up = is_bmp and (width * 3) % 4 == 0
+    if is_bmp and not bottom_up:
+        return PILHelper.to_native_key_format(deck, image)
+
+    method = _orientation(rotation, image_format["flip"], bottom_up)
+    if method is not None:
+        image = image.transpose(method)
+
+    if bottom_up:
+        return _bmp_header(*image.size) + image.tobytes("raw", "BGR")
+
+    with io.BytesIO() as stream:
+        image.save(stream, image_format["format"], quality=100)
+        return stream.getvalue()
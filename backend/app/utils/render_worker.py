@@ -0,0 +1,60 @@
+"""Entry point of render worker processes.
+
+Workers unpickle render_job from here, so this module imports only the
+image renderer and the frame ring, not the services with their threads,
+singletons and integrations.
+"""
+from typing import NamedTuple, Optional, Union
+
+from .frame_ring import write_slot
+from .image import image_renderer
+
+
+class KeyFormat:
+    """Stand-in for a deck in worker processes; the renderer only needs its key image format."""
+    def __init__(self, image_format: dict):
+        self._image_format = image_format
+
+    def key_image_format(self) -> dict:
+        return self._image_format
+
+
+class RenderJob(NamedTuple):
+    """Inputs of one key render, small enough to send to a worker process."""
+    image_format: dict
+    blank: bool = False
+    icon_path: Optional[str] = None
+    label: Optional[str] = None
+    background_color: Optional[str] = None
+    icon_color: Optional[str] = None
+    font_size: int = 14
+    font_family: Optional[str] = None
+    slot: Optional[tuple] = None  # (ring name, stride, slot, seq) to write the image into
+
+
+def render_job(job: RenderJob) -> Union[bytes, int]:
+    """Render a job with this process's renderer and its caches.
+
+    Jobs with a slot write the image into shared memory and return only its
+    length; the bytes are returned if the image cannot go into the slot.
+    """
+    native = render_native(job)
+    if job.slot and write_slot(*job.slot, native):
+        return len(native)
+    return native
+
+
+def render_native(job: RenderJob) -> bytes:
+    """Render a job to native key image bytes."""
+    deck = KeyFormat(job.image_format)
+    if job.blank:
+        return image_renderer.render_blank_key(deck, job.background_color or "#000000")
+    return image_renderer.render_key_image(
+        deck,
+        icon_path=job.icon_path,
+        label=job.label,
+        background_color=job.background_color,
+        icon_color=job.icon_color,
+        font_size=job.font_size,
+        font_family=job.font_family
+    )
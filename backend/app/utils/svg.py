@@ -0,0 +1,64 @@
+"""Rasterization of SVG icons at the exact size they are shown at."""
+import hashlib
+import io
+import os
+import threading
+from typing import Optional, Tuple
+from PIL import Image
+import logging
+
+from ..config import settings
+
+try:
+    import cairosvg
+    CAIROSVG_AVAILABLE = True
+except (ImportError, OSError):
+    # OSError: cairosvg is installed, but the cairo library is not
+    CAIROSVG_AVAILABLE = False
+    cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+_warned = False
+
+
+def is_svg(path: Optional[str]) -> bool:
+    return bool(path) and path.lower().endswith(".svg")
+
+
+def svg_supported() -> bool:
+    """Whether SVG icons can be rendered, warning once if not."""
+    global _warned
+    if not CAIROSVG_AVAILABLE and not _warned:
+        _warned = True
+        logger.warning("cairosvg not available, SVG icons are not shown. Install with: pip install cairosvg")
+    return CAIROSVG_AVAILABLE
+
+
+def rasterize_svg(path: str, mtime: int, size: Tuple[int, int]) -> Image.Image:
+    """Rasterize an SVG to fit size, as RGBA.
+
+    Results are kept on disk by file, modification time and size, so each
+    icon is rasterized once per key size, not once per server start.
+    """
+    width, height = size
+    name = hashlib.blake2b(repr((path, mtime, width, height)).encode(), digest_size=16).hexdigest()
+    cache_file = os.path.join(settings.svg_cache_path, f"{name}.png")
+
+    try:
+        with open(cache_file, "rb") as f:
+            data = f.read()
+    except OSError:
+        data = cairosvg.svg2png(url=path, output_width=width, output_height=height)
+        try:
+            os.makedirs(settings.svg_cache_path, exist_ok=True)
+            # Write under a temporary name so readers never see half a file
+            temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, "wb") as f:
+                f.write(data)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not cache rasterized {path}: {e}")
+
+    with Image.open(io.BytesIO(data)) as image:
+        return image.convert("RGBA")
@@ -0,0 +1,73 @@
+"""Small previews of icons for the editor, cached on disk by content hash."""
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+from PIL import Image
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (Pillow format, media type, save options)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 85, "method": 4}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85}),
+}
+
+# path -> (mtime, size, content hash); hashing reads the whole file, so it is done once per version
+_hashes: Dict[str, Tuple[int, int, str]] = {}
+_hashes_lock = threading.Lock()
+
+
+def file_version(path: str) -> str:
+    """Token that changes whenever an icon file is replaced or edited, from its
+    modification time and size; cheap enough to take for every icon."""
+    stat = os.stat(path)
+    return hashlib.blake2b(f"{stat.st_mtime_ns}-{stat.st_size}".encode(), digest_size=8).hexdigest()
+
+
+def content_hash(path: str) -> str:
+    """Hash of an icon file's content, recomputed only when the file changes."""
+    stat = os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hashes_lock:
+        _hashes[path] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+
+def get_thumbnail(path: str, size: int, format: str) -> Tuple[str, str]:
+    """Path of a thumbnail fitting size x size, and the original's content hash.
+
+    Thumbnails are named after the content hash, so an edited icon gets a
+    new file and a stale one is never served.
+    """
+    image_format, _, options = THUMBNAIL_FORMATS[format]
+    digest = content_hash(path)
+    cache_file = os.path.join(settings.thumbnail_cache_path, f"{digest}-{size}.{format}")
+    if os.path.exists(cache_file):
+        return cache_file, digest
+
+    with Image.open(path) as icon:
+        # First frame of animated icons
+        icon.thumbnail((size, size), Image.LANCZOS)
+        image = icon.convert("RGB" if image_format == "JPEG" else "RGBA")
+
+    os.makedirs(settings.thumbnail_cache_path, exist_ok=True)
+    # Write under a temporary name so readers never see half a file
+    temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    image.save(temp_file, image_format, **options)
+    os.replace(temp_file, cache_file)
+    logger.debug(f"Created {size}px {format} thumbnail of {path}")
+    return cache_file, digest
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of native key format conversion for every deck model.
+
+Compares PILHelper.to_native_key_format with app.utils.native on a
+rendered key (icon and label) and checks that both produce the same bytes.
+
+    cd backend && python -m benchmarks.native_format [--iterations N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+from StreamDeck.ImageHelpers import PILHelper  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.utils import native  # noqa: E402
+from app.utils.image import image_renderer  # noqa: E402
+from app.services.virtual_deck import MODELS, VirtualStreamDeck  # noqa: E402
+
+
+def sample_key(deck) -> Image.Image:
+    """An RGB key image with an icon and a label, as the renderer produces."""
+    icon = os.path.join(settings.images_path, "Released.png")
+    with Image.open(icon) as source:
+        image = PILHelper.create_scaled_key_image(deck, source, margins=[0, 0, 20, 0])
+    ImageDraw.Draw(image).text(
+        (image.width / 2, image.height - 5),
+        "12:34",
+        font=image_renderer.get_font(None, 14),
+        anchor="ms",
+        fill="white"
+    )
+    return image.convert("RGB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'model':<10} {'format':<6} {'PILHelper':>11} {'native':>11} {'speedup':>8}  identical")
+    for model in MODELS:
+        deck = VirtualStreamDeck("bench", model=model)
+        image = sample_key(deck)
+
+        identical = PILHelper.to_native_key_format(deck, image.copy()) == native.to_native_key_format(deck, image)
+        baseline = timeit.timeit(lambda: PILHelper.to_native_key_format(deck, image), number=args.iterations)
+        fast = timeit.timeit(lambda: native.to_native_key_format(deck, image), number=args.iterations)
+
+        print(
+            f"{model:<10} {deck.key_image_format()['format']:<6} "
+            f"{baseline / args.iterations * 1e6:>9.1f}us {fast / args.iterations * 1e6:>9.1f}us "
+            f"{baseline / fast:>7.2f}x  {identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
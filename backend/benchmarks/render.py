@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Rendering benchmark suite for every deck model and key scenario.
+
+Measures ImageRenderer.render_key_image and render_blank_key in renders per
+second and Python heap allocated per render, in three cache modes:
+
+    cold    no caches, every render decodes, scales and encodes
+    warm    icon, base layer and font caches, no finished key cache
+            (a data key whose label changes every refresh)
+    cached  all caches, every render is a finished key cache hit
+
+    cd backend
+    python -m benchmarks.render                     # print results
+    python -m benchmarks.render --save              # store them as the baseline
+    python -m benchmarks.render --compare           # fail on regressions
+
+Baselines are machine specific, compare only against one saved on the
+same machine. Pillow allocates pixel memory outside the Python heap, so
+the allocation figures cover Python objects only.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.virtual_deck import MODELS, VirtualStreamDeck  # noqa: E402
+from app.utils.image import ImageRenderer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "render.json")
+
+ICON = "/api/icons/asset/Released.png"
+
+SCENARIOS: Dict[str, Callable] = {
+    "blank": lambda r, deck: r.render_blank_key(deck, "#202020"),
+    "icon_only": lambda r, deck: r.render_key_image(deck, icon_path=ICON),
+    "label_only": lambda r, deck: r.render_key_image(deck, label="Lights"),
+    "icon_label": lambda r, deck: r.render_key_image(deck, icon_path=ICON, label="Lights"),
+    "background_tint": lambda r, deck: r.render_key_image(deck, icon_path=ICON, background_color="#1e3a8a"),
+    "multiline_label": lambda r, deck: r.render_key_image(deck, label="CPU\n42%", icon_color="#22c55e"),
+    "numeric_label": lambda r, deck: r.render_key_image(deck, label="12:34:56", background_color="#111827"),
+}
+
+MODES = ("cold", "warm", "cached")
+
+
+def make_renderer(mode: str) -> ImageRenderer:
+    renderer = ImageRenderer()
+    # A cache with no budget stores nothing
+    if mode in ("cold", "warm"):
+        renderer.key_cache.max_bytes = 0
+    if mode == "cold":
+        renderer.icon_cache.max_bytes = 0
+        renderer.base_cache.max_bytes = 0
+        renderer.use_icon_variants = False
+    return renderer
+
+
+def measure(render: Callable, min_time: float) -> Dict[str, float]:
+    """Renders per second (best of three runs) and Python heap bytes per render."""
+    render()  # Warm up caches and lazy imports
+
+    # Calibrate the number of renders so a run takes about min_time
+    count = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(count):
+            render()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 5:
+            break
+        count *= 2
+    count = max(1, int(count * min_time / elapsed / 3))
+
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(count):
+            render()
+        best = min(best, time.perf_counter() - started)
+
+    samples = min(count, 200)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(samples):
+            render()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "renders_per_sec": round(count / best, 1),
+        "us_per_render": round(best / count * 1e6, 1),
+        "peak_kib": round((peak - before) / 1024, 1),
+        "retained_bytes_per_render": round(max(0, current - before) / samples, 1),
+    }
+
+
+def run(models, scenarios, modes, min_time: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for mode in modes:
+        for model in models:
+            deck = VirtualStreamDeck("bench", model=model)
+            for scenario in scenarios:
+                renderer = make_renderer(mode)
+                result = measure(lambda: SCENARIOS[scenario](renderer, deck), min_time)
+                results[f"{mode}/{model}/{scenario}"] = result
+                print(
+                    f"{mode:<7} {model:<9} {scenario:<16} "
+                    f"{result['renders_per_sec']:>10.0f}/s {result['us_per_render']:>9.1f}us "
+                    f"{result['peak_kib']:>8.1f}KiB peak {result['retained_bytes_per_render']:>8.1f}B retained",
+                    flush=True
+                )
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """Print regressions against a baseline, returning how many there were."""
+    regressions = 0
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        ratio = result["renders_per_sec"] / old["renders_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions += 1
+            print(f"REGRESSION {name}: {old['renders_per_sec']:.0f}/s -> {result['renders_per_sec']:.0f}/s ({ratio - 1:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--min-time", type=float, default=0.3, help="Seconds to spend per measurement")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a regression, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    results = run(args.models, args.scenarios, args.modes, args.min_time)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}, run with --save first")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"{regressions} regression(s) against {args.baseline}")
+        if regressions:
+            sys.exit(1)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -55,6 +55,8 @@ export default function ButtonEditor({
     icon_path: '',
     icon_color: '#ffffff',
     background_color: '#000000',
+    font_family: '',
+    font_size: null,
     action_id: '',
     is_toggle: false,
     on_color: '#22c55e',
@@ -83,6 +85,8 @@ export default function ButtonEditor({
         icon_path: button.icon_path || '',
         icon_color: button.icon_color || '#ffffff',
         background_color: button.background_color || '#000000',
+        font_family: button.font_family || '',
+        font_size: button.font_size ?? null,
         action_id: button.action_id || '',
         is_toggle: button.is_toggle || false,
         on_color: button.on_color || '#22c55e',
@@ -103,6 +107,7 @@ export default function ButtonEditor({
     const data = { ...formData }
     if (!data.action_id) delete data.action_id
     if (!data.icon_path) delete data.icon_path
+    if (!data.font_family) data.font_family = null
     onSave(position, data)
   }
 
@@ -253,6 +258,39 @@ export default function ButtonEditor({
             </div>
           </div>
 
+          <div className="grid grid-cols-2 gap-4">
+            <div>
+              <label className="label">Font</label>
+              <input
+                type="text"
+                value={formData.font_family}
+                onChange={(e) =>
+                  setFormData({ ...formData, font_family: e.target.value })
+                }
+                placeholder="Roboto-Regular"
+                className="input"
+              />
+            </div>
+
+            <div>
+              <label className="label">Font Size</label>
+              <input
+                type="number"
+                min={6}
+                max={72}
+                value={formData.font_size ?? ''}
+                onChange={(e) =>
+                  setFormData({
+                    ...formData,
+                    font_size: e.target.value ? parseInt(e.target.value, 10) : null,
+                  })
+                }
+                placeholder="14"
+                className="input"
+              />
+            </div>
+          </div>
+
           <div>
             <label className="label">Action</label>
             <div className="flex gap-2">
@@ -2,6 +2,10 @@ import { useState, useEffect, useRef } from 'react'
 import { Upload, X, Image as ImageIcon, Trash2 } from 'lucide-react'
 import { iconsApi } from '../../services/api'
 
+// Thumbnail URLs with the icon's version are cached by the browser for good
+const thumbnailUrl = (icon) =>
+  `${icon.path}/thumbnail?size=128${icon.version ? `&v=${icon.version}` : ''}`
+
 export default function IconPicker({ value, onChange, onClose }) {
   const [icons, setIcons] = useState([])
   const [loading, setLoading] = useState(true)
@@ -150,7 +154,7 @@ export default function IconPicker({ value, onChange, onClose }) {
                           style={{ borderColor: value === icon.path ? undefined : 'var(--color-border)' }}
                         >
                           <img
-                            src={icon.path}
+                            src={thumbnailUrl(icon)}
                             alt={icon.name}
                             className="w-full h-full object-contain"
                           />
@@ -191,7 +195,7 @@ export default function IconPicker({ value, onChange, onClose }) {
                           style={{ borderColor: value === icon.path ? undefined : 'var(--color-border)' }}
                         >
                           <img
-                            src={icon.path}
+                            src={thumbnailUrl(icon)}
                             alt={icon.name}
                             className="w-full h-full object-contain"
                           />